@@ -258,16 +258,23 @@ function promptWordsAutocomplete(context) {
 
     const query = word.text;
 
-    // Only trigger if query is at least 3 letters and contains only letters
-    if (query.length < 3 || !/^[a-zA-Z]+$/.test(query)) return null;
+    // Short prefixes are cheap on the server (precomputed top-k), so start from one letter
+    if (!/[a-zA-Z]/.test(query)) return null;
 
-    return fetch(`/sd-prompt-lab/autocomplete?q=${encodeURIComponent(query)}`)
+    return fetch(`/sd-prompt-lab/autocomplete/v2?q=${encodeURIComponent(query)}&limit=20`)
         .then(res => res.json())
         .then(data => {
             return {
                 from: word.from,
-                options: data.results.map(w => ({label: w, type: "keyword"})),
-                validFor: /^\w*$/
+                // Results arrive ranked by the server (prefix before infix, then by weight);
+                // boost keeps that order since CodeMirror otherwise sorts equal scores by label
+                options: data.results.map((r, i) => ({
+                    label: r.label,
+                    type: r.uses ? "keyword" : "variable",
+                    detail: r.post_count ? r.post_count.toLocaleString() : undefined,
+                    boost: 99 - i
+                })),
+                filter: false
             };
         });
 }
@@ -20,7 +20,9 @@
         category: null,
         sort: 'post_count',
         includeDeprecated: false,
+        minSources: null,
         offset: 0,
+        cursor: null,
         total: 0,
         loading: false,
         done: false,
@@ -37,6 +39,7 @@
         search: 'sd-prompt-lab-tags-search',
         sort: 'sd-prompt-lab-tags-sort',
         deprecated: 'sd-prompt-lab-tags-deprecated',
+        minSources: 'sd-prompt-lab-tags-min-sources',
         count: 'sd-prompt-lab-tags-count',
         categories: 'sd-prompt-lab-tags-categories',
         list: 'sd-prompt-lab-tags-list',
@@ -51,6 +54,8 @@
         dialog: 'sd-prompt-lab-tags-dialog',
         dialogCancel: 'sd-prompt-lab-tags-dialog-cancel',
         presetsList: 'sd-prompt-lab-tags-presets-list',
+        presetsRefresh: 'sd-prompt-lab-tags-presets-refresh',
+        presetsRefreshStatus: 'sd-prompt-lab-tags-presets-refresh-status',
     };
 
     const $ = (id) => gradioApp()?.getElementById(id);
@@ -218,15 +223,16 @@
 
     // ---- data loading --------------------------------------------------------
 
-    function buildQuery(offset) {
+    function buildQuery(cursor) {
         const p = new URLSearchParams();
         if (state.q) p.set('q', state.q);
         if (state.category != null) p.set('category', state.category);
         if (state.source) p.set('source', state.source);
         if (state.includeDeprecated) p.set('include_deprecated', 'true');
+        if (state.minSources) p.set('min_sources', state.minSources);
         p.set('sort', state.sort);
         p.set('limit', PAGE_SIZE);
-        p.set('offset', offset);
+        if (cursor) p.set('cursor', cursor);
         return p.toString();
     }
 
@@ -252,9 +258,10 @@
         state.loading = true;
 
         const offset = reset ? 0 : state.offset;
+        const cursor = reset ? null : state.cursor;
         setStatus(reset ? 'Searching…' : 'Loading more…');
         try {
-            const res = await fetch(`${API}/tags?${buildQuery(offset)}`);
+            const res = await fetch(`${API}/tags?${buildQuery(cursor)}`);
             if (!res.ok) throw new Error('Failed to load tags');
             const data = await res.json();
 
@@ -272,12 +279,14 @@
             list.insertAdjacentHTML('beforeend', rows);
 
             state.offset = offset + (data.tags || []).length;
-            if ((data.tags || []).length < PAGE_SIZE || state.offset >= state.total) {
+            state.cursor = data.next_cursor || null;
+            if (!state.cursor || state.offset >= state.total) {
                 state.done = true;
             }
 
             if (state.total === 0) {
                 list.innerHTML = '<div class="spl-tags-noresults">No entries available to display.</div>';
+                if (state.q) await loadSuggestions(state.q);
             }
             setStatus('Ready');
         } catch (e) {
@@ -287,8 +296,23 @@
         }
     }
 
+    // Nothing contains the query: offer close spellings (e.g. a pasted "blonde_hiar").
+    async function loadSuggestions(q) {
+        const p = new URLSearchParams({q, limit: 10});
+        if (state.includeDeprecated) p.set('include_deprecated', 'true');
+        const res = await fetch(`${API}/tags/fuzzy?${p}`);
+        if (!res.ok || state.q !== q) return;
+        const data = await res.json();
+        const tags = data.tags || [];
+        if (!tags.length) return;
+        const list = $(ids.list);
+        list.innerHTML = '<div class="spl-tags-noresults">No exact matches. Did you mean:</div>'
+            + tags.map(tagRowHtml).join('');
+    }
+
     function resetAndLoad() {
         state.offset = 0;
+        state.cursor = null;
         state.done = false;
         loadPage(true);
     }
@@ -428,7 +452,9 @@
             state.source = result?.source || '';
             const hasData = await loadSources();  // toggles empty <-> browser
             if (hasData) resetAndLoad();
-            flashStatus(`Downloaded "${result?.name || id}"`);
+            flashStatus(result?.updated === false
+                ? `"${result?.name || id}" is already up to date`
+                : `Downloaded "${result?.name || id}"`);
         } catch (e) {
             flashStatus(`Error: ${e.message}`);
             if (btn) btn.textContent = 'Download';
@@ -438,6 +464,41 @@
         }
     }
 
+    // Job id the server uses for "check all for updates" (polled like a preset download).
+    const REFRESH_JOB_ID = '*refresh*';
+
+    async function refreshPresets() {
+        const pct = $(ids.presetsRefreshStatus);
+        const dialog = $(ids.dialog);
+        const buttons = dialog ? dialog.querySelectorAll('button') : [];
+        buttons.forEach((b) => (b.disabled = true));
+        try {
+            const res = await fetch(`${API}/tags/presets/refresh`, {method: 'POST'});
+            const data = await res.json().catch(() => ({}));
+            if (!res.ok) throw new Error(data.detail || 'Update check failed');
+
+            const result = await pollDownload(REFRESH_JOB_ID, {pct}, null);
+            const presets = result?.presets || [];
+            const updated = presets.filter((r) => r.updated).length;
+            const failed = presets.filter((r) => r.error).length;
+
+            await loadPresets();
+            if (updated) {
+                const hasData = await loadSources();
+                if (hasData) resetAndLoad();
+            }
+            if (pct) {
+                pct.textContent = (updated ? `${updated} updated` : 'Everything is up to date')
+                    + (failed ? ` · ${failed} failed` : '');
+            }
+        } catch (e) {
+            flashStatus(`Error: ${e.message}`);
+            if (pct) pct.textContent = '';
+        } finally {
+            buttons.forEach((b) => (b.disabled = false));
+        }
+    }
+
     function ensureProgressUi(rowEl) {
         const info = rowEl.querySelector('.spl-tags-preset-info');
         let wrap = rowEl.querySelector('.spl-tags-preset-progress');
@@ -493,12 +554,14 @@
                 let text = has
                     ? `${fmtBytes(p.downloaded)} / ${fmtBytes(p.total)} · ${(ratio * 100).toFixed(0)}%`
                     : `${fmtBytes(p.downloaded)} downloaded`;
-                // Multi-source downloads report which file of how many is in flight.
+                // Multi-source downloads report the sources in flight and how many are finished.
                 if (p.files_total > 0) {
-                    const n = Math.min((p.files_done || 0) + 1, p.files_total);
                     const label = p.label ? `${p.label} ` : '';
-                    text = `${label}(${n}/${p.files_total}) · ${text}`;
+                    text = `${label}(${p.files_done || 0}/${p.files_total} done) · ${text}`;
+                    if (p.failed?.length) text += ` · ${p.failed.length} failed`;
                 }
+                // JSONL/CSV presets are imported while they download.
+                if (p.imported > 0) text += ` · ${Number(p.imported).toLocaleString()} tags imported`;
                 pct.textContent = text;
             }
             if (btn) btn.textContent = 'Downloading…';
@@ -513,6 +576,9 @@
                     : 'Importing…';
             }
             if (btn) btn.textContent = 'Importing…';
+        } else if (p.phase === 'checking') {
+            if (pct) pct.textContent = p.label ? `Checking ${p.label} for updates…` : 'Checking for updates…';
+            if (btn) btn.textContent = 'Checking…';
         } else if (p.phase === 'starting') {
             if (pct) pct.textContent = 'Starting…';
             if (btn) btn.textContent = 'Starting…';
@@ -557,6 +623,11 @@
             resetAndLoad();
         });
 
+        $(ids.minSources)?.addEventListener('change', (e) => {
+            state.minSources = e.target.value ? Number(e.target.value) : null;
+            resetAndLoad();
+        });
+
         $(ids.categories)?.addEventListener('click', (e) => {
             const chip = e.target.closest('[data-cat]');
             if (!chip) return;
@@ -611,6 +682,7 @@
         $(ids.dialog)?.addEventListener('click', (e) => {
             if (e.target === $(ids.dialog)) closeDialog();
         });
+        $(ids.presetsRefresh)?.addEventListener('click', refreshPresets);
         $(ids.presetsList)?.addEventListener('click', (e) => {
             const btn = e.target.closest('[data-action="download"]');
             if (!btn) return;
@@ -1,5 +1,7 @@
 (() => {
     const API = '/sd-prompt-lab/validator';
+    const RESOLVE_API = '/sd-prompt-lab/tags/resolve';
+    const RESOLVE_BATCH = 50000;   // names per request (the server's limit)
 
     // ---------------------------------------------------------------------
     // Pure logic (exported on window.SplTagValidator for unit testing in Node)
@@ -51,6 +53,18 @@
         return String(seg ?? '').trim().toLowerCase();
     }
 
+    // Dataset lookup form of a tag segment: weight and emphasis brackets are
+    // dropped, escaped brackets kept, e.g. "(ganyu \(genshin\):1.2)" -> "ganyu (genshin)".
+    function lookupName(seg) {
+        return String(seg ?? '')
+            .trim()
+            .replace(/:\s*-?[\d.]+\s*(?=[)\]}]*$)/, '')
+            .replace(/(^|[^\\])[()[\]{}]+/g, '$1')
+            .replace(/\\([()[\]{}])/g, '$1')
+            .replace(/\s+/g, ' ')
+            .trim();
+    }
+
     // Collapse broken comma sequences: runs of commas (",,", ", ,") become one,
     // leading/trailing commas are dropped, and spacing is normalized to ", ".
     // Works inside brackets too, e.g. "(b,, c)" -> "(b, c)".
@@ -220,7 +234,7 @@
     }
 
     window.SplTagValidator = {
-        splitPrompts, tokenize, tagKey, purge, fixCommas, removeSegment,
+        splitPrompts, tokenize, tagKey, lookupName, purge, fixCommas, removeSegment,
         isBalanced, validate, removeUnmatchedBrackets, fixPrompt,
     };
 
@@ -242,6 +256,9 @@
         editor: null,
         silentChange: false,
         history: {undo: [], redo: []},   // tag-mode edit snapshots
+        lookup: new Map(),  // lower-cased lookupName -> resolved dataset tag | null (unknown)
+        resolving: new Set(),
+        noDatasets: false,  // the last lookup found no tag dataset; retried when the tab is reopened
     };
 
     const ids = {
@@ -380,6 +397,54 @@
         });
     }
 
+    // ---- dataset lookup --------------------------------------------------
+
+    function lookupInfo(seg) {
+        const name = lookupName(seg);
+        return name ? state.lookup.get(name.toLowerCase()) : undefined;
+    }
+
+    // Resolve every tag of `texts` not looked up yet against the tag datasets,
+    // all cards in one request, then re-render so unknown tags get flagged.
+    async function resolveTags(texts) {
+        if (state.noDatasets) return;
+        const names = new Map();
+        for (const text of texts) {
+            for (const seg of tokenize(text)) {
+                const name = lookupName(seg);
+                const key = name.toLowerCase();
+                if (name && !state.lookup.has(key) && !state.resolving.has(key)) names.set(key, name);
+            }
+        }
+        if (names.size === 0) return;
+        const keys = [...names.keys()];
+        keys.forEach((k) => state.resolving.add(k));
+        try {
+            for (let i = 0; i < keys.length; i += RESOLVE_BATCH) {
+                const batch = keys.slice(i, i + RESOLVE_BATCH);
+                const res = await fetch(RESOLVE_API, jsonBody({names: batch.map((k) => names.get(k))}));
+                if (!res.ok) throw new Error(`Request failed: ${res.status}`);
+                const data = await res.json();
+                // No tag dataset yet: leave the names unresolved (so unflagged) and stop asking
+                // until the tab is reopened, e.g. after a download in the Tag Browser.
+                if (data.available === false) {
+                    state.noDatasets = true;
+                    return;
+                }
+                (data.tags || []).forEach((tag, j) => state.lookup.set(batch[j], tag.found ? tag : null));
+            }
+        } finally {
+            keys.forEach((k) => state.resolving.delete(k));
+        }
+        if (!activeCard()) return;
+        renderIssues();
+        if (state.mode === 'tags') renderChips(false);
+    }
+
+    function resolveInBackground(texts) {
+        resolveTags(texts).catch((e) => console.error('Tag Validator: tag lookup failed', e));
+    }
+
     // ---- undo / redo history (tag-mode edits) ---------------------------
 
     function snapshot() {
@@ -493,11 +558,13 @@
         let approved = 0;
         let declined = 0;
         let neutral = 0;
+        let unknown = 0;
         for (const seg of tokenize(card.text)) {
             const st = chipStatus(tagKey(seg));
             if (st === 'approved') approved++;
             else if (st === 'declined') declined++;
             else neutral++;
+            if (lookupInfo(seg) === null) unknown++;
         }
         const counts =
             `<span class="spl-tv-status-count" title="Not-approved tags in this prompt">`
@@ -508,6 +575,9 @@
             + `<span class="material-symbols-rounded" aria-hidden="true">cancel</span>${declined}</span>`;
 
         const issues = validate(card.text);
+        if (unknown > 0) {
+            issues.push({code: 'unknown', msg: `${unknown} tag${unknown === 1 ? '' : 's'} not in the tag datasets`});
+        }
         const issuesHtml = issues.length === 0
             ? '<span class="spl-tv-issue spl-tv-issue-ok">'
                 + '<span class="material-symbols-rounded" aria-hidden="true">verified</span>Valid</span>'
@@ -519,7 +589,9 @@
         el.innerHTML = counts + issuesHtml;
     }
 
-    function renderChips() {
+    // `resolve` is off when re-rendering with the results of a lookup, so that a render
+    // never starts the next one.
+    function renderChips(resolve = true) {
         const el = $(ids.chips);
         const card = activeCard();
         if (!el || !card) return;
@@ -531,8 +603,19 @@
         }
         el.innerHTML = segs.map((seg, i) => {
             const status = chipStatus(tagKey(seg));
+            const info = lookupInfo(seg);
+            let extra = '';
+            let title = '';
+            if (info === null) {
+                extra = ' is-unknown';
+                title = 'Not in the tag datasets';
+            } else if (info) {
+                extra = info.is_deprecated ? ' is-deprecated' : '';
+                title = `${info.name} · ${Number(info.post_count || 0).toLocaleString()} posts`
+                    + (info.is_deprecated ? ' · deprecated' : '');
+            }
             return `
-                <span class="spl-tv-chip is-${status}" data-index="${i}">
+                <span class="spl-tv-chip is-${status}${extra}" data-index="${i}" title="${escapeHtml(title)}">
                     <span class="spl-tv-chip-text">${escapeHtml(seg)}</span>
                     <span class="spl-tv-chip-actions">
                         <button type="button" class="spl-tv-chip-approve" data-index="${i}" title="Approve tag" aria-label="Approve tag">
@@ -545,6 +628,7 @@
                 </span>`;
         }).join('');
         el.scrollTop = scrollTop;
+        if (resolve) resolveInBackground([card.text]);
     }
 
     function renderApproveButton() {
@@ -816,6 +900,7 @@
         state.cards.push(...created);
         clearHistory();
         renderCards();
+        resolveInBackground(created.map((c) => c.text));
         if (created.length > 0) selectCard(created[0].id).catch((e) => console.error(e));
     }
 
@@ -1039,6 +1124,7 @@
         if (!state.cards.some((c) => c.id === state.activeId)) state.activeId = null;
         clearHistory();
         renderAll();
+        resolveInBackground(state.cards.map((c) => c.text));
     }
 
     async function init() {
@@ -1062,7 +1148,13 @@
         const btn = Array.from(tabNav.querySelectorAll('button')).find((b) =>
             b.textContent.trim().toLowerCase().startsWith('tag validator'));
         if (!btn) return;
-        btn.addEventListener('click', () => init());
+        btn.addEventListener('click', () => {
+            if (!state.initialized) return init();
+            if (state.noDatasets) {
+                state.noDatasets = false;
+                resolveInBackground(state.cards.map((c) => c.text));
+            }
+        });
     }
 
     onUiLoaded(() => {
@@ -1,4 +1,5 @@
 import hashlib
+import math
 import mimetypes
 import os
 import shutil
@@ -19,12 +20,23 @@ import scripts.prompt_lab.sd_promt_lab_env as env
 # In-flight / finished dataset download jobs, keyed by preset id (see the preset download routes).
 _download_jobs = {}
 _download_jobs_lock = threading.Lock()
+# _download_jobs key of the "refresh all presets" job (not a valid preset id).
+_REFRESH_JOB_ID = "*refresh*"
 
 # Single background cache-rebuild job (see the cache rebuild routes). A big first import
 # (e.g. after adding the site_tags dataset) runs here with progress instead of blocking a read.
 _rebuild_job = {"phase": "idle", "imported": 0, "done": True, "error": None}
 _rebuild_job_lock = threading.Lock()
 
+# Upper bound for one /tags/resolve batch (a whole Tag Validator session fits in one call).
+_RESOLVE_MAX_NAMES = 50000
+
+# Autocomplete v2 puts the user's saved words (by uses) and dataset tags (by post_count) on one
+# log scale: a word saved 3 times ranks like a tag with about 10k posts.
+_AUTOCOMPLETE_USES_WEIGHT = 2.0
+# Infix matches (only on request) need a query the trigram index can serve.
+_AUTOCOMPLETE_INFIX_MIN = 3
+
 
 # Pydantic model for input validation
 class PromptData(BaseModel):
@@ -57,6 +69,10 @@ class TagPresetDownloadRequest(BaseModel):
     id: str
 
 
+class TagResolveRequest(BaseModel):
+    names: list[str]
+
+
 class ValidatorCardsCreate(BaseModel):
     texts: list[str]
 
@@ -117,6 +133,80 @@ def _build_wildcards_editor_tree(directory, base=""):
     return result
 
 
+def _autocomplete_key(text):
+    return " ".join(text.lower().replace("_", " ").split())
+
+
+def _ranked_autocomplete(q, limit, infix=False):
+    """Saved words and dataset tags starting with `q`, merged by name (spaces and underscores
+    alike) and ordered by combined weight.
+
+    This runs per keystroke, so it only reads precomputed data: the saved words' prefix
+    index and the published cache generation's top-k rows / prefix index as they are (saved
+    words alone if there is none). `infix` adds names containing `q` elsewhere, after the
+    prefix matches; those come from scans and the trigram index, and cost more.
+    """
+    merged = {}
+
+    def add(label, uses=0, post_count=0, category=None):
+        entry = merged.setdefault(_autocomplete_key(label), {
+            "label": label, "uses": 0, "post_count": 0, "category": None,
+        })
+        if uses:
+            entry["label"] = label  # the user's own spelling wins
+        entry["uses"] = max(entry["uses"], uses)
+        entry["post_count"] = max(entry["post_count"], post_count or 0)
+        if category is not None:
+            entry["category"] = category
+
+    for row in db.rank_prompt_words(q, limit=limit, infix=infix):
+        add(row["word"], uses=row["uses"])
+    tags_q = q.replace(" ", "_")
+    tags = []
+    if tags_db.get_tags_db_path() is not None:
+        tags = tags_db.complete_tags(tags_q, limit=limit)
+        if infix and len(tags_q) >= _AUTOCOMPLETE_INFIX_MIN:
+            tags += tags_db.query_tags(q=tags_q, limit=limit)
+    for tag in tags:
+        add(tag["name"], post_count=tag["post_count"], category=tag["category"])
+
+    key = _autocomplete_key(q)
+    results = []
+    for entry_key, entry in merged.items():
+        entry["prefix"] = entry_key.startswith(key)
+        entry["score"] = round(
+            math.log10(1 + entry["post_count"])
+            + _AUTOCOMPLETE_USES_WEIGHT * math.log2(1 + entry["uses"]), 3)
+        results.append(entry)
+    results.sort(key=lambda e: (not e["prefix"], -e["score"], e["label"]))
+    return results[:limit]
+
+
+def _start_download_job(job_id, work):
+    """Run work(job) in a background thread as _download_jobs[job_id], unless one is running."""
+    with _download_jobs_lock:
+        existing = _download_jobs.get(job_id)
+        if existing and not existing.get("done"):
+            return {"status": "already_running"}
+        job = {"phase": "starting", "downloaded": 0, "total": 0,
+               "imported": 0, "done": False, "error": None, "result": None}
+        _download_jobs[job_id] = job
+
+    def run():
+        try:
+            result = work(job)
+            job.update(phase="done", done=True, result=result)
+        except ValueError as e:
+            job.update(phase="error", done=True, error=str(e))
+        except requests.RequestException as e:
+            job.update(phase="error", done=True, error=f"Download failed: {e}")
+        except Exception as e:
+            job.update(phase="error", done=True, error=str(e))
+
+    threading.Thread(target=run, daemon=True).start()
+    return {"status": "started", "id": job_id}
+
+
 def init_api(app: FastAPI):
     @app.get("/sd-prompt-lab/autocomplete")
     async def autocomplete(request: Request):
@@ -129,6 +219,25 @@ def init_api(app: FastAPI):
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.get("/sd-prompt-lab/autocomplete/v2")
+    def autocomplete_v2(q: str = Query(""), limit: int = Query(20), infix: bool = Query(False)):
+        q = q.strip()
+        if not q:
+            return {"results": []}
+        try:
+            return {"results": _ranked_autocomplete(q, max(1, min(limit, 100)), infix=infix)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    # Must stay ahead of the /sd-prompt-lab/{prompt_id} catch-all.
+    @app.get("/sd-prompt-lab/related-tags")
+    async def related_tags(prompt: str = Query(""), limit: int = Query(20)):
+        try:
+            limit = max(1, min(limit, 100))
+            return {"results": db.get_related_tags(utils.parse_prompts(prompt), limit=limit)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
     @app.post("/sd-prompt-lab/save")
     async def save_prompt_endpoint(data: PromptData):
         try:
@@ -243,28 +352,17 @@ def init_api(app: FastAPI):
         preset = tag_presets.get_preset(data.id)
         if not preset:
             raise HTTPException(status_code=400, detail=f"Unknown preset '{data.id}'")
-
-        with _download_jobs_lock:
-            existing = _download_jobs.get(data.id)
-            if existing and not existing.get("done"):
-                return {"status": "already_running"}
-            job = {"phase": "starting", "downloaded": 0, "total": 0,
-                   "imported": 0, "done": False, "error": None, "result": None}
-            _download_jobs[data.id] = job
-
-        def run():
-            try:
-                result = tags_db.download_preset(preset, progress=job)
-                job.update(phase="done", done=True, result=result)
-            except ValueError as e:
-                job.update(phase="error", done=True, error=str(e))
-            except requests.RequestException as e:
-                job.update(phase="error", done=True, error=f"Download failed: {e}")
-            except Exception as e:
-                job.update(phase="error", done=True, error=str(e))
-
-        threading.Thread(target=run, daemon=True).start()
-        return {"status": "started", "id": data.id}
+        return _start_download_job(
+            data.id, lambda job: tags_db.download_preset(preset, progress=job)
+        )
+
+    # Re-checks every downloaded preset against upstream; unchanged ones cost a HEAD request.
+    # Progress is polled like a download, with id=*refresh*.
+    @app.post("/sd-prompt-lab/tags/presets/refresh")
+    def refresh_tag_presets():
+        return _start_download_job(
+            _REFRESH_JOB_ID, lambda job: {"presets": tags_db.refresh_presets(progress=job)}
+        )
 
     @app.get("/sd-prompt-lab/tags/presets/download/progress")
     def download_tag_preset_progress(id: str = Query(...)):
@@ -291,6 +389,7 @@ def init_api(app: FastAPI):
 
         def run():
             try:
+                tags_db.invalidate_sources()
                 tags_db.ensure_cache(progress_cb=lambda n: _rebuild_job.update(imported=n))
                 _rebuild_job.update(phase="done", done=True)
             except Exception as e:
@@ -316,15 +415,55 @@ def init_api(app: FastAPI):
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.post("/sd-prompt-lab/tags/resolve")
+    def resolve_tags(data: TagResolveRequest):
+        if len(data.names) > _RESOLVE_MAX_NAMES:
+            raise HTTPException(status_code=400, detail=f"At most {_RESOLVE_MAX_NAMES} names per request")
+        try:
+            tags_db.ensure_cache()
+            # Without any dataset every name would come back unknown; the client then skips
+            # unknown-tag flagging instead of marking the whole prompt.
+            if not tags_db.has_tags():
+                return {"available": False, "tags": []}
+            return {"available": True, "tags": tags_db.resolve_tags(data.names)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.get("/sd-prompt-lab/tags/complete")
+    def complete_tags(q: str = Query(""), limit: int = Query(20)):
+        try:
+            tags_db.ensure_cache()
+            limit = max(1, min(limit, 100))
+            return {"tags": tags_db.complete_tags(q, limit=limit)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.get("/sd-prompt-lab/tags/fuzzy")
+    async def get_fuzzy_tags(
+            q: str = Query(...),
+            limit: int = Query(10),
+            max_distance: int = Query(2),
+            include_deprecated: bool = Query(False),
+    ):
+        try:
+            tags_db.ensure_cache()
+            limit = max(1, min(limit, 50))
+            return {"tags": tags_db.fuzzy_tags(q, limit=limit, max_distance=max_distance,
+                                               include_deprecated=include_deprecated)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
     @app.get("/sd-prompt-lab/tags")
     async def get_tags(
             q: str = Query(None),
             category: int = Query(None),
             source: str = Query(None),
             include_deprecated: bool = Query(False),
+            min_sources: int = Query(None),
             sort: str = Query("post_count"),
             limit: int = Query(60),
             offset: int = Query(0),
+            cursor: str = Query(None),
     ):
         try:
             tags_db.ensure_cache()
@@ -334,19 +473,27 @@ def init_api(app: FastAPI):
             offset = max(0, offset)
 
             # Only honour a source that actually exists in the cache.
-            known_sources = {s["source"] for s in tags_db.list_sources()}
-            if source not in known_sources:
+            sources = tags_db.list_sources()
+            if source not in {s["source"] for s in sources}:
                 source = None
 
             filters = dict(q=q, category=category, source=source,
-                           include_deprecated=include_deprecated)
+                           include_deprecated=include_deprecated, min_sources=min_sources)
+            tags = tags_db.query_tags(sort=sort, limit=limit, offset=offset, cursor=cursor,
+                                      **filters)
+            # Keyset paging: pass next_cursor back as `cursor` for the following page.
+            next_cursor = tags_db.tag_cursor(tags[-1], sort) if len(tags) == limit else None
             return {
-                "tags": tags_db.query_tags(sort=sort, limit=limit, offset=offset, **filters),
+                "tags": tags,
+                "next_cursor": next_cursor,
                 "total": tags_db.count_tags(**filters),
                 "categories": tags_db.category_counts(
-                    source=source, include_deprecated=include_deprecated),
-                "sources": tags_db.list_sources(),
+                    source=source, include_deprecated=include_deprecated,
+                    min_sources=min_sources),
+                "sources": sources,
             }
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,7 +1,16 @@
+import json
 import os
 import sqlite3
 
 import scripts.prompt_lab.sd_promt_lab_env as env
+import scripts.prompt_lab.sd_prompt_lab_utils as utils
+
+# Tag co-occurrence over the saved prompts. prompt_tags holds each prompt's parsed tags;
+# tag_pairs holds, in both directions, how many prompts contain both tags of a pair. Only
+# pairs that occur are stored, pairs come from at most _COOC_MAX_TAGS tags per prompt, and a
+# tag keeps roughly its _COOC_MAX_PARTNERS most frequent companions.
+_COOC_MAX_TAGS = 64
+_COOC_MAX_PARTNERS = 256
 
 
 def get_db_path():
@@ -30,6 +39,57 @@ def migrate_add_favorite():
     conn.close()
 
 
+def migrate_add_cooccurrence():
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prompt_tags'")
+        if c.fetchone():
+            return
+        c.execute("""
+                    CREATE TABLE prompt_tags (
+                        prompt_id INTEGER NOT NULL,
+                        tag TEXT NOT NULL,
+                        PRIMARY KEY (prompt_id, tag)
+                    ) WITHOUT ROWID
+                """)
+        c.execute("""
+                    CREATE TABLE IF NOT EXISTS tag_pairs (
+                        a TEXT NOT NULL,
+                        b TEXT NOT NULL,
+                        n INTEGER NOT NULL,
+                        PRIMARY KEY (a, b)
+                    ) WITHOUT ROWID
+                """)
+        c.execute("SELECT id, prompt FROM prompts")
+        for prompt_id, prompt in c.fetchall():
+            _set_prompt_tags(c, prompt_id, utils.parse_prompts(prompt or ""))
+        conn.commit()
+        print("Database migrated: tag co-occurrence index built")
+
+
+def migrate_add_word_uses():
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("PRAGMA table_info(prompt_words)")
+        if "uses" in [col[1] for col in c.fetchall()]:
+            return
+        c.execute("ALTER TABLE prompt_words ADD COLUMN uses INTEGER NOT NULL DEFAULT 1")
+        # Best estimate for words saved so far: the prompts that still contain them. Counted
+        # in one pass into a keyed temp table (prompt_tags has no index on tag to look up).
+        c.execute("""
+            CREATE TEMP TABLE word_uses (tag TEXT PRIMARY KEY, n INTEGER NOT NULL) WITHOUT ROWID
+        """)
+        c.execute("INSERT INTO word_uses SELECT tag, COUNT(*) FROM prompt_tags GROUP BY tag")
+        c.execute("""
+            UPDATE prompt_words SET uses = MAX(1, COALESCE(
+                (SELECT n FROM word_uses WHERE word_uses.tag = prompt_words.word), 0
+            ))
+        """)
+        c.execute("DROP TABLE word_uses")
+        conn.commit()
+        print("Database migrated: 'uses' column added to prompt_words")
+
+
 def init_db():
     with connect() as conn:
         c = conn.cursor()
@@ -48,11 +108,20 @@ def init_db():
         c.execute("""
                     CREATE TABLE IF NOT EXISTS prompt_words (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        word TEXT NOT NULL UNIQUE
+                        word TEXT NOT NULL UNIQUE,
+                        uses INTEGER NOT NULL DEFAULT 1
                     )
                 """)
         conn.commit()
         migrate_add_favorite()
+        migrate_add_cooccurrence()
+        migrate_add_word_uses()
+    with connect() as conn:
+        # Case-insensitive prefix lookups for autocomplete (LIKE 'q%' becomes a range on it)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_prompt_words_nocase ON prompt_words(word COLLATE NOCASE)"
+        )
+        conn.commit()
 
 
 def insert_prompt_words_list(words: list[str]):
@@ -61,13 +130,54 @@ def insert_prompt_words_list(words: list[str]):
 
     with connect() as conn:
         c = conn.cursor()
-        # Insert words, ignore duplicates
+        # Insert new words, count another use of known ones
         c.executemany("""
-            INSERT OR IGNORE INTO prompt_words (word) VALUES (?)
+            INSERT INTO prompt_words (word, uses) VALUES (?, 1)
+            ON CONFLICT(word) DO UPDATE SET uses = uses + 1
         """, [(word,) for word in words])
         conn.commit()
 
 
+def _pair_rows(tags):
+    tags = tags[:_COOC_MAX_TAGS]
+    return [(a, b) for a in tags for b in tags if a != b]
+
+
+def _set_prompt_tags(c, prompt_id, tags):
+    """Replace a prompt's tags (parse_prompts output, [] on delete) and adjust tag_pairs."""
+    c.execute("SELECT tag FROM prompt_tags WHERE prompt_id = ? ORDER BY tag", (prompt_id,))
+    old = [row[0] for row in c.fetchall()]
+    tags = sorted(set(tags))
+    if old == tags:
+        return
+
+    c.execute("DELETE FROM prompt_tags WHERE prompt_id = ?", (prompt_id,))
+    c.executemany("INSERT INTO prompt_tags (prompt_id, tag) VALUES (?, ?)",
+                  [(prompt_id, tag) for tag in tags])
+    # Pairs a pruned tag no longer holds are simply not there to decrement.
+    c.executemany("UPDATE tag_pairs SET n = n - 1 WHERE a = ? AND b = ?", _pair_rows(old))
+    # Drop what reached zero in both directions: (a, b) and its mirror (b, a) alike.
+    c.execute("""
+        DELETE FROM tag_pairs WHERE n <= 0
+          AND a IN (SELECT value FROM json_each(?1)) AND b IN (SELECT value FROM json_each(?1))
+    """, (json.dumps(old[:_COOC_MAX_TAGS]),))
+    c.executemany("""
+        INSERT INTO tag_pairs (a, b, n) VALUES (?, ?, 1)
+        ON CONFLICT(a, b) DO UPDATE SET n = n + 1
+    """, _pair_rows(tags))
+
+    for tag in tags[:_COOC_MAX_TAGS]:
+        c.execute("SELECT COUNT(*) FROM tag_pairs WHERE a = ?", (tag,))
+        if c.fetchone()[0] <= 2 * _COOC_MAX_PARTNERS:
+            continue
+        # Cut the long tail in one go once it has doubled, rather than on every save.
+        c.execute("""
+            DELETE FROM tag_pairs WHERE a = ?1 AND b IN (
+                SELECT b FROM tag_pairs WHERE a = ?1 ORDER BY n DESC, b LIMIT -1 OFFSET ?2
+            )
+        """, (tag, _COOC_MAX_PARTNERS))
+
+
 def update_prompt_image_path(prompt_id: int, new_path: str):
     with connect() as conn:
         c = conn.cursor()
@@ -98,6 +208,7 @@ def save_or_update_prompt(data: dict):
             # Existing and override=False
             return None
 
+        _set_prompt_tags(c, prompt_id, utils.parse_prompts(data["prompt"]))
         conn.commit()
         return prompt_id
 
@@ -142,6 +253,7 @@ def delete_prompt_by_id(prompt_id: int):
         c = conn.cursor()
         # Delete prompt
         c.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
+        _set_prompt_tags(c, prompt_id, [])
         conn.commit()
 
 
@@ -183,9 +295,56 @@ def set_prompt_favorite(prompt_id: int, is_favorite: bool):
         conn.commit()
 
 
+def rank_prompt_words(query: str, limit: int = 30, infix: bool = False):
+    """Saved words starting with `query` (case-insensitive), most used first.
+
+    The prefix match is a range on idx_prompt_words_nocase. With `infix`, words containing
+    `query` elsewhere follow; that is a scan of every saved word.
+    """
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT word, uses FROM prompt_words
+            WHERE word LIKE ? ESCAPE '\\'
+            ORDER BY uses DESC, word
+            LIMIT ?
+        """, (escaped + "%", limit))
+        rows = [{"word": row[0], "uses": row[1], "prefix": True} for row in c.fetchall()]
+        if infix and len(rows) < limit:
+            c.execute("""
+                SELECT word, uses FROM prompt_words
+                WHERE word LIKE ?1 ESCAPE '\\' AND word NOT LIKE ?2 ESCAPE '\\'
+                ORDER BY uses DESC, word
+                LIMIT ?3
+            """, ("%" + escaped + "%", escaped + "%", limit - len(rows)))
+            rows += [{"word": row[0], "uses": row[1], "prefix": False} for row in c.fetchall()]
+        return rows
+
+
 def search_prompt_words(query: str, limit: int = 30):
     with connect() as conn:
         c = conn.cursor()
         like_query = f"%{query}%"
-        c.execute("SELECT DISTINCT word FROM prompt_words WHERE word LIKE ? LIMIT ?", (like_query, limit))
+        # The order this always had (a walk of the unique index); explicit so that
+        # idx_prompt_words_nocase can't change it.
+        c.execute("SELECT DISTINCT word FROM prompt_words WHERE word LIKE ? ORDER BY word LIMIT ?",
+                  (like_query, limit))
         return [row[0] for row in c.fetchall()]
+
+
+def get_related_tags(tags: list[str], limit: int = 20):
+    """Tags most often saved together with `tags`, scored by summed co-occurrence counts."""
+    if not tags:
+        return []
+    with connect() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT b, SUM(n) AS score FROM tag_pairs
+            WHERE a IN (SELECT value FROM json_each(?1))
+              AND b NOT IN (SELECT value FROM json_each(?1))
+            GROUP BY b
+            ORDER BY score DESC, b
+            LIMIT ?2
+        """, (json.dumps(tags), limit))
+        return [{"tag": row[0], "score": row[1]} for row in c.fetchall()]
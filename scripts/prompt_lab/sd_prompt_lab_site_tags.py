@@ -21,13 +21,14 @@ LOCAL_DIR = "site_tags"
 GENERAL, ARTIST, COPYRIGHT, CHARACTER, META, SPECIES = 0, 1, 3, 4, 5, 6
 
 
-def _rec(r, name, post_count, category, is_deprecated=0, words=None):
-    """Return the original record with canonical fields overlaid (keeps extras as metadata)."""
-    out = dict(r)
-    out["name"] = name
-    out["post_count"] = post_count
-    out["category"] = category
-    out["is_deprecated"] = 1 if is_deprecated else 0
+def _rec(name, post_count, category, is_deprecated=0, words=None):
+    """Return the canonical fields for a record (the importer keeps the original as metadata)."""
+    out = {
+        "name": name,
+        "post_count": post_count,
+        "category": category,
+        "is_deprecated": 1 if is_deprecated else 0,
+    }
     if words is not None:
         out["words"] = words
     return out
@@ -36,7 +37,7 @@ def _rec(r, name, post_count, category, is_deprecated=0, words=None):
 # --- Danbooru-native: danbooru / safebooru / atfbooru --------------------------------
 # category is already 0/1/3/4/5; name/post_count/is_deprecated/words are canonical.
 def _danbooru(r):
-    return _rec(r, r.get("name"), r.get("post_count"), r.get("category"),
+    return _rec(r.get("name"), r.get("post_count"), r.get("category"),
                 r.get("is_deprecated"), r.get("words"))
 
 
@@ -47,7 +48,7 @@ _E621_CAT = {0: GENERAL, 1: ARTIST, 3: COPYRIGHT, 4: CHARACTER, 5: SPECIES, 7: M
 
 
 def _e621(r):
-    return _rec(r, r.get("name"), r.get("post_count"), _E621_CAT.get(r.get("category")))
+    return _rec(r.get("name"), r.get("post_count"), _E621_CAT.get(r.get("category")))
 
 
 # --- Gelbooru (string type): gelbooru.com --------------------------------------------
@@ -59,13 +60,13 @@ def _gelbooru_str(r):
     t = str(r.get("type", "")).lower()
     deprecated = t == "deprecated"
     category = GENERAL if deprecated else _GELBOORU_STR.get(t)
-    return _rec(r, r.get("name"), r.get("count"), category, is_deprecated=deprecated)
+    return _rec(r.get("name"), r.get("count"), category, is_deprecated=deprecated)
 
 
 # --- Gelbooru (numeric type): rule34 / hypnohub / xbooru -----------------------------
 # Numeric codes already match the Danbooru scheme (0/1/3/4/5).
 def _gelbooru_num(r):
-    return _rec(r, r.get("name"), r.get("count"), r.get("type"))
+    return _rec(r.get("name"), r.get("count"), r.get("type"))
 
 
 # --- Moebooru: konachan.com / konachan.net / yande.re --------------------------------
@@ -74,11 +75,11 @@ _MOEBOORU_CAT = {0: GENERAL, 1: ARTIST, 3: COPYRIGHT, 4: CHARACTER}
 
 
 def _moebooru(r):
-    return _rec(r, r.get("name"), r.get("count"), _MOEBOORU_CAT.get(r.get("type")))
+    return _rec(r.get("name"), r.get("count"), _MOEBOORU_CAT.get(r.get("type")))
 
 
 def _lolibooru(r):  # Moebooru variant: tag_type + post_count field names.
-    return _rec(r, r.get("name"), r.get("post_count"), _MOEBOORU_CAT.get(r.get("tag_type")))
+    return _rec(r.get("name"), r.get("post_count"), _MOEBOORU_CAT.get(r.get("tag_type")))
 
 
 # --- Sankaku: chan.sankakucomplex.com ------------------------------------------------
@@ -88,7 +89,7 @@ _SANKAKU_CAT = {0: GENERAL, 1: ARTIST, 3: COPYRIGHT, 4: CHARACTER, 5: META, 8: M
 
 def _sankaku(r):
     words = [w for w in (r.get("trans_en"), r.get("trans_ja")) if w]
-    return _rec(r, r.get("name"), r.get("post_count"), _SANKAKU_CAT.get(r.get("type")),
+    return _rec(r.get("name"), r.get("post_count"), _SANKAKU_CAT.get(r.get("type")),
                 words=words or None)
 
 
@@ -101,7 +102,7 @@ _ZEROCHAN_CAT = {
 
 
 def _zerochan(r):
-    return _rec(r, r.get("tag"), r.get("total"),
+    return _rec(r.get("tag"), r.get("total"),
                 _ZEROCHAN_CAT.get(str(r.get("type", "")).lower()))
 
 
@@ -114,7 +115,7 @@ _WALLHAVEN_CAT = {
 
 
 def _wallhaven(r):
-    return _rec(r, r.get("name"), r.get("posts"),
+    return _rec(r.get("name"), r.get("posts"),
                 _WALLHAVEN_CAT.get(str(r.get("category_name", "")).lower()))
 
 
@@ -127,11 +128,11 @@ def _pixiv(r):
         category = GENERAL
     else:
         category = None
-    return _rec(r, r.get("name"), r.get("posts"), category)
+    return _rec(r.get("name"), r.get("posts"), category)
 
 
 def _anime_pictures(r):  # anime-pictures' numeric types don't map cleanly; keep name/count.
-    return _rec(r, r.get("tag"), r.get("num"), None)
+    return _rec(r.get("tag"), r.get("num"), None)
 
 
 def _generic(r):  # Fallback for an unrecognized future site directory.
@@ -142,7 +143,7 @@ def _generic(r):  # Fallback for an unrecognized future site directory.
     category = r.get("category")
     if not isinstance(category, int):
         category = None
-    return _rec(r, name, post_count, category)
+    return _rec(name, post_count, category)
 
 
 _ADAPTERS = {
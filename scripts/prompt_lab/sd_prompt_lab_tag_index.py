@@ -0,0 +1,366 @@
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+# Compact, memory-mapped prefix index over a cache generation's tags, for autocomplete.
+#
+# Written once per generation (.cache/tags-<n>.idx, next to tags-<n>.db) by the rebuild and
+# only read afterwards. Names are stored in NOCASE order (ASCII case folded, like the cache's
+# name index) so a prefix is one bisect away; per-block maxima of post_count let the most
+# popular completions of even a one-letter prefix be found without visiting every match.
+#
+# Layout: magic, u32 header length, JSON header {count, fanout, sections: {name: [offset,
+# length, typecode]}}, then, from the next 8-byte boundary (where section offsets count from),
+# 8-byte aligned native-endian arrays:
+#   names    - UTF-8 names, back to back
+#   offsets  - count + 1 start offsets into names
+#   post     - post_count per name
+#   category - category per name (-1 when unknown)
+#   max1..   - max post_count per block of _FANOUT entries, per block of those blocks, ...
+#   order0.. - per block, its members' positions (0.._FANOUT-1) by descending post_count:
+#              order0 ranks the entries of each max1 block, order1 the max1 blocks of each
+#              max2 block, and so on
+
+_MAGIC = b"SPLTIDX1"
+_FANOUT = 64
+_ALIGN = 8
+
+# Mapped index of the most recently used path (readers only ever want the published one).
+_loaded = {"path": None, "index": None}
+_loaded_lock = threading.Lock()
+
+
+def _fold(data):
+    return data.lower()  # bytes.lower() folds ASCII only, matching SQLite's NOCASE
+
+
+def _prefix_key(text):
+    """Folded form of a name's leading characters, as grouped for the top-k lists."""
+    return text.lower() if text.isascii() else _fold(text.encode("utf-8")).decode("utf-8")
+
+
+def _category(cat):
+    return cat if cat is not None and -1 <= cat < 1 << 15 else -1
+
+
+def _block_levels(values, reuse=(), unchanged=0):
+    """[(maxima, order)] per level above `values`; see the layout above.
+
+    `reuse` holds the levels of an index whose first `unchanged` values equal these; the
+    blocks that lie entirely within them are copied instead of ranked again.
+    """
+    levels = []
+    while len(values) > 1:
+        maxima, order = array("q"), array("B")
+        kept = unchanged // _FANOUT if len(levels) < len(reuse) else 0
+        if kept:
+            old_maxima, old_order = reuse[len(levels)]
+            maxima.frombytes(old_maxima[:kept].cast("B"))
+            order.frombytes(old_order[:kept * _FANOUT].cast("B"))
+        for start in range(kept * _FANOUT, len(values), _FANOUT):
+            block = values[start:start + _FANOUT]
+            ranked = sorted(range(len(block)), key=block.__getitem__, reverse=True)
+            maxima.append(block[ranked[0]])
+            order.extend(ranked)
+        levels.append((maxima, order))
+        values, unchanged = maxima, kept
+    return levels
+
+
+def _merge_topk(leaves, topk):
+    """{prefix: [[name, post_count, category], ...]} for every prefix of the `leaves` keys,
+    best first: a shorter prefix's top-k is among the top-k of the leaves under it."""
+    merged = {}
+    for leaf, heap in leaves.items():
+        for length in range(1, len(leaf) + 1):
+            merged.setdefault(leaf[:length], []).extend(heap)
+    return {
+        prefix: [[name, post_count, cat] for post_count, _, name, cat in heapq.nlargest(topk, entries)]
+        for prefix, entries in merged.items()
+    }
+
+
+def write_index(conn, path, prefix_len=0, topk=20):
+    """Write the prefix index for the non-deprecated tags in `conn` to `path` (atomically).
+
+    With a `prefix_len` the same pass also collects the `topk` most popular tags for every
+    folded prefix of 1..prefix_len characters and returns them as {prefix: [[name,
+    post_count, category], ...]} (ties in index order, like prefix_search); otherwise {}.
+    """
+    names = bytearray()
+    offsets = array("Q", [0])
+    post = array("q")
+    category = array("h")
+    leaves = {}  # folded first prefix_len characters -> min-heap of (post_count, -i, name, cat)
+    leaf = heap = None
+    # The unique name index is NOCASE, so this streams in index order without a sort.
+    for i, (name, post_count, cat) in enumerate(conn.execute(
+            "SELECT name, post_count, category FROM tags WHERE is_deprecated = 0 ORDER BY name"
+    )):
+        names += name.encode("utf-8")
+        offsets.append(len(names))
+        post.append(post_count or 0)
+        cat = _category(cat)
+        category.append(cat)
+        if prefix_len:
+            key = _prefix_key(name[:prefix_len])
+            if key != leaf:
+                leaf, heap = key, leaves.setdefault(key, [])
+            entry = (post_count or 0, -i, name, cat if cat >= 0 else None)
+            if len(heap) < topk:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heappushpop(heap, entry)
+
+    _write(path, names, offsets, post, category, _block_levels(post))
+    return _merge_topk(leaves, topk)
+
+
+def _write(path, names, offsets, post, category, levels):
+    sections = [("names", names, "B"), ("offsets", offsets, "Q"), ("post", post, "q"),
+                ("category", category, "h")]
+    for i, (maxima, order) in enumerate(levels):
+        sections += [(f"max{i + 1}", maxima, "q"), (f"order{i}", order, "B")]
+
+    layout = {}
+    position = 0
+    for key, data, typecode in sections:
+        length = len(data) * (data.itemsize if isinstance(data, array) else 1)
+        layout[key] = [position, length, typecode]
+        position += length + (-length % _ALIGN)
+    header = json.dumps({"count": len(post), "fanout": _FANOUT, "sections": layout}).encode("utf-8")
+    start = len(_MAGIC) + 4 + len(header)
+    start += -start % _ALIGN
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_MAGIC + struct.pack("<I", len(header)) + header)
+        f.write(b"\0" * (start - f.tell()))
+        for key, data, _ in sections:
+            f.write(data)
+            f.write(b"\0" * (-f.tell() % _ALIGN))
+    os.replace(tmp, path)
+
+
+def patch_index(old, path, changes, prefix_len=0, topk=20):
+    """Write to `path` the index `old` (as returned by load) with `changes` applied, which
+    gives the same file as write_index over the changed tags.
+
+    `changes` are (name, tag) pairs: tag is the name's new (name, post_count, category), or
+    None if it is gone or deprecated now; names match case-insensitively. Runs between
+    changes are copied in bulk, and blocks before the first change keep their ranking. With a
+    `prefix_len` the top-k lists are returned (as by write_index) for the prefixes of the
+    changed names only; a prefix left without tags maps to [].
+    """
+    edits = sorted((_fold(name.encode("utf-8")), name, tag) for name, tag in changes)
+    old_names, old_offsets = old["names"], old["offsets"]
+    names = bytearray()
+    offsets = array("Q", [0])
+    post = array("q")
+    category = array("h")
+
+    def keep(start, end):
+        if start >= end:
+            return
+        shift = len(names) - old_offsets[start]
+        names.extend(old_names[old_offsets[start]:old_offsets[end]])
+        if shift:
+            offsets.extend([offset + shift for offset in old_offsets[start + 1:end + 1]])
+        else:
+            offsets.frombytes(old_offsets[start + 1:end + 1].cast("B"))
+        post.frombytes(old["post"][start:end].cast("B"))
+        category.frombytes(old["category"][start:end].cast("B"))
+
+    position = 0
+    unchanged = None
+    for key, _, tag in edits:
+        i = _lower_bound(old, key)
+        keep(position, i)
+        position = i
+        if unchanged is None:
+            unchanged = len(post)
+        if i < old["count"] and _fold(_name(old, i)) == key:
+            position += 1  # replaced or dropped
+        if tag is not None:
+            name, post_count, cat = tag
+            names.extend(name.encode("utf-8"))
+            offsets.append(len(names))
+            post.append(post_count or 0)
+            category.append(_category(cat))
+    keep(position, old["count"])
+
+    reuse = list(zip(old["max"], old["order"]))
+    levels = _block_levels(post, reuse, len(post) if unchanged is None else unchanged)
+    _write(path, names, offsets, post, category, levels)
+    if not prefix_len or not edits:
+        return {}
+    prefixes = {
+        _prefix_key(name[:length])
+        for _, name, _ in edits for length in range(1, min(prefix_len, len(name)) + 1)
+    }
+    index = _open(path)
+    return {prefix: _prefix_topk(index, prefix, topk) for prefix in prefixes}
+
+
+def _prefix_topk(index, prefix, topk):
+    """write_index's top-k list for one prefix: by post_count, ties in index order."""
+    lo, hi = _prefix_range(index, _fold(prefix.encode("utf-8")))
+    post = index["post"]
+    found = _top_positions(index, lo, hi, topk)
+    if len(found) == topk:
+        # The values are right, but equal counts may come from anywhere in the walk: keep
+        # those above the cutoff and take the cutoff value's first entries in index order.
+        cutoff = post[found[-1]]
+        found = [i for i in found if post[i] > cutoff]
+        for i in range(lo, hi):
+            if len(found) == topk:
+                break
+            if post[i] == cutoff:
+                found.append(i)
+    found.sort(key=lambda i: (-post[i], i))
+    category = index["category"]
+    return [
+        [_name(index, i).decode("utf-8"), post[i], category[i] if category[i] >= 0 else None]
+        for i in found
+    ]
+
+
+def _open(path):
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(_MAGIC)] != _MAGIC:
+        raise ValueError("not a tag index")
+    (header_len,) = struct.unpack_from("<I", mapped, len(_MAGIC))
+    start = len(_MAGIC) + 4
+    header = json.loads(mapped[start:start + header_len])
+    start += header_len
+    start += -start % _ALIGN
+    view = memoryview(mapped)
+    sections = {
+        key: view[start + offset:start + offset + length].cast(typecode)
+        for key, (offset, length, typecode) in header["sections"].items()
+    }
+    depth = sum(1 for key in sections if key.startswith("max"))
+    return {
+        "count": header["count"],
+        "fanout": header["fanout"],
+        "names": sections["names"],
+        "offsets": sections["offsets"],
+        "post": sections["post"],
+        "category": sections["category"],
+        "max": [sections[f"max{i + 1}"] for i in range(depth)],
+        "order": [sections[f"order{i}"] for i in range(depth)],
+    }
+
+
+def load(path):
+    """The mapped index at `path` (opened on first use), or None if there is none.
+
+    A previously loaded index is dropped rather than closed: lookups still running on it keep
+    it mapped, and it is unmapped with the last reference.
+    """
+    with _loaded_lock:
+        if _loaded["path"] != path:
+            try:
+                index = _open(path)
+            except (OSError, ValueError, KeyError):
+                index = None
+            _loaded.update(path=path, index=index)
+        return _loaded["index"]
+
+
+def release():
+    """Drop the loaded index (e.g. before its generation file is removed)."""
+    with _loaded_lock:
+        _loaded.update(path=None, index=None)
+
+
+def _name(index, i):
+    offsets = index["offsets"]
+    return bytes(index["names"][offsets[i]:offsets[i + 1]])
+
+
+def _lower_bound(index, key):
+    """Position of the first entry whose folded name is not below the folded `key`."""
+    lo, hi = 0, index["count"]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _fold(_name(index, mid)) < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _prefix_range(index, prefix):
+    """[lo, hi) of the entries whose folded name starts with the folded `prefix`."""
+    start = lo = _lower_bound(index, prefix)
+    hi = index["count"]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _fold(_name(index, mid))[:len(prefix)] == prefix:
+            lo = mid + 1
+        else:
+            hi = mid
+    return start, lo
+
+
+def prefix_search(index, prefix, limit=20):
+    """Top `limit` tags starting with `prefix` by post_count, as {name, post_count, category}.
+
+    [lo, hi) is covered by the largest aligned blocks that fit, then walked best-first: a
+    popped block queues only its best member, and a popped member queues its next-best
+    sibling, so a query touches about `limit` nodes per level however wide the range is.
+    """
+    lo, hi = _prefix_range(index, _fold(prefix.encode("utf-8")))
+    category = index["category"]
+    post = index["post"]
+    return [
+        {
+            "name": _name(index, i).decode("utf-8"),
+            "post_count": post[i],
+            "category": category[i] if category[i] >= 0 else None,
+        }
+        for i in _top_positions(index, lo, hi, limit)
+    ]
+
+
+def _top_positions(index, lo, hi, limit):
+    """Positions of the (up to) `limit` largest post_counts in [lo, hi), best first."""
+    if lo >= hi or limit <= 0:
+        return []
+    post = index["post"]
+    levels = [post] + index["max"]
+    order = index["order"]
+    fanout = index["fanout"]
+
+    # Heap entries: (-post_count, level, node, rank among its siblings or -1 if it has none).
+    heap = []
+    position = lo
+    while position < hi:
+        level, size = 0, 1
+        while (level + 1 < len(levels) and position % (size * fanout) == 0
+               and position + size * fanout <= hi):
+            level, size = level + 1, size * fanout
+        node = position // size
+        heap.append((-levels[level][node], level, node, -1))
+        position += size
+    heapq.heapify(heap)
+
+    found = []
+    while heap and len(found) < limit:
+        _, level, node, rank = heapq.heappop(heap)
+        first = node - node % fanout
+        if 0 <= rank < fanout - 1 and first + rank + 1 < len(levels[level]):
+            sibling = first + order[level][first + rank + 1]
+            heapq.heappush(heap, (-levels[level][sibling], level, sibling, rank + 1))
+        if level == 0:
+            found.append(node)
+        else:
+            child = node * fanout + order[level - 1][node * fanout]
+            heapq.heappush(heap, (-levels[level - 1][child], level - 1, child, 0))
+    return found
@@ -59,6 +59,12 @@ LEFT JOIN (
 #                 datasets/<local_dir>/<source>/tags.<fmt>. Absent = a single tag file.
 #   import      - optional, default True. False marks a dataset as download-only: its files
 #                 are fetched but not yet ingested into the browsing cache.
+#   segments    - optional, single-file presets only: how many concurrent byte ranges a large
+#                 file is fetched in when the server supports ranges (default 4, 1 = off).
+#   concurrency - optional, "multi_source" only: how many sources download at once
+#                 (default 4).
+#   on_error    - optional, "multi_source" only: "fail" (default) stops at the first source
+#                 that fails to download; "continue" skips it and reports it in the result.
 PRESETS = [
     {
         "id": "danbooru-tags",
@@ -106,6 +112,8 @@ PRESETS = [
         "mapping": None,
         # Download-only for now: files are fetched but not ingested into the browsing cache.
         "import": False,
+        # The sites are independent dumps: one unreachable site shouldn't cost the others.
+        "on_error": "continue",
     },
 ]
 
@@ -1,29 +1,106 @@
+import base64
+import collections
+import contextlib
 import csv
+import functools
+import hashlib
+import io
 import json
+import multiprocessing
 import os
+import re
+import shutil
+import site
 import sqlite3
+import sys
 import threading
 import time
+import types
+import unicodedata
+import urllib.request
+import zlib
+from concurrent.futures import (
+    ALL_COMPLETED, FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
+from concurrent.futures.process import BrokenProcessPool
 
 import requests
 
+try:
+    import orjson
+except ImportError:  # optional: a faster JSON codec for imports; the stdlib json is the fallback
+    orjson = None
+
 import scripts.prompt_lab.sd_promt_lab_env as env
 import scripts.prompt_lab.sd_prompt_lab_tag_presets as presets_registry
 import scripts.prompt_lab.sd_prompt_lab_site_tags as site_tags
+import scripts.prompt_lab.sd_prompt_lab_tag_index as tag_index
 
 # Serializes cache rebuilds so a background download's import can't race concurrent readers.
 _rebuild_lock = threading.Lock()
 
+# After ensure_cache() finds the cache current it trusts that for a few seconds instead of
+# walking datasets/ on every read; downloads and explicit rebuilds call invalidate_sources().
+_SOURCES_CHECK_TTL = 5.0
+_sources_checked = {"dir": None, "until": 0.0}
+# The published generation's path as of the pointer file's stat (path, mtime, size, inode):
+# lookups stat the pointer instead of reading it, and _publish records its own swap here.
+_published = {"current": (None, None)}  # "current": (pointer stat key, generation path)
+
+# Idle read-only connections to the published generation, reused across requests (see connect()).
+_READ_POOL_SIZE = 8
+_READ_MMAP_BYTES = 1 << 30
+_READ_CACHE_KIB = 16 * 1024  # per connection; mmap serves most reads from the OS page cache
+_read_pool = []  # [(generation path, connection)]
+_read_pool_lock = threading.Lock()
+
+# In-process LRU of browser query results, keyed by the call and the published generation so
+# a rebuild makes old entries unreachable (_publish also drops them). Bounded by JSON size.
+_RESULT_CACHE_BYTES = 16 << 20
+_result_cache = collections.OrderedDict()  # key -> (result, size)
+_result_cache_stats = {"hits": 0, "misses": 0, "bytes": 0}
+_result_cache_lock = threading.Lock()
+
 # Recursive tag dataset cache.
 #
 # Sources: every *.jsonl / *.json / *.csv file at any depth under datasets/ (except .cache).
 # When several share the same folder + base name, the richest format wins (jsonl > json > csv).
 # All sources are merged into a single, de-duplicated SQLite cache keyed by tag name.
-# The cache is rebuilt only when the set of sources (or their mtime/size) changes.
+# Every source's rows are kept in tag_sources; `tags` holds the max-post_count winner per name.
+# Only sources whose mtime/size (or manifest) changed are re-imported, and only the names they
+# touch have their winner recomputed.
+#
+# Each rebuild writes a new generation file (.cache/tags-<n>.db) next to the live one and then
+# atomically repoints .cache/tags.current at it, so readers only ever open a fully built cache
+# and a failed rebuild leaves the published generation untouched.
 
 _CACHE_DIR_NAME = ".cache"
-_CACHE_DB_NAME = "tags.db"
+_CACHE_DB_PREFIX = "tags-"  # generation files: tags-<n>.db
+_CACHE_POINTER_NAME = "tags.current"  # holds the published generation number
+_LEGACY_DB_NAME = "tags.db"  # pre-generation single-file cache, removed on first publish
 _IMPORT_BATCH = 5000
+_BULK_CACHE_KIB = 256 * 1024  # SQLite page cache while building a generation
+# Parsing runs in a process pool (one SQLite writer) when there is enough file data to split.
+_IMPORT_WORKERS = max(1, min(8, (os.cpu_count() or 1) - 1))
+_PARALLEL_CHUNK = 16 << 20  # JSONL byte range per work unit; smaller json/csv files go whole
+_PARALLEL_MIN_BYTES = 32 << 20  # below this, pool startup costs more than it saves
+# Directory holding this extension's `scripts` package. The WebUI takes it off sys.path again
+# after loading extensions, so spawned import workers put it back before any work arrives.
+_EXTENSION_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Tag metadata lives in tag_metadata as zlib blocks of up to _META_BLOCK records from one source
+# (shared keys and values compress far better together than record by record); each tag_sources
+# row points at its (meta_block, meta_slot). A record is "<overlay JSON>\x1f<original JSON>".
+_META_BLOCK = 64
+_META_RECORD_SEP = b"\x1e"  # control characters never occur raw in JSON text
+_META_OVERLAY_SEP = b"\x1f"
+# .json sources are decoded incrementally: text is read in chunks and a single value may not
+# exceed the cap (a runaway buffer means the file is malformed, not that a tag is that big).
+_JSON_READ_CHUNK = 1 << 20
+_JSON_MAX_VALUE = 64 << 20
+# Bump whenever the cache tables change shape; a mismatch forces a full rebuild.
+_SCHEMA_VERSION = "10"
+# cache_meta key prefix for per-source signatures ("source:<datasets-relative path>").
+_SOURCE_SIG_PREFIX = "source:"
 
 # Per-dataset manifest written on preset download (records format + how to interpret it).
 _MANIFEST_NAME = ".spl-dataset.json"
@@ -41,22 +118,162 @@ def get_cache_dir():
     return os.path.join(get_datasets_dir(), _CACHE_DIR_NAME)
 
 
+def _generation_path(generation):
+    return os.path.join(get_cache_dir(), f"{_CACHE_DB_PREFIX}{generation}.db")
+
+
+def _index_path(db_path):
+    """The generation's prefix index (see sd_prompt_lab_tag_index), beside its database."""
+    return os.path.splitext(db_path)[0] + ".idx"
+
+
+def _current_generation():
+    """Return the published generation number, or 0 when no cache has been built yet."""
+    try:
+        with open(os.path.join(get_cache_dir(), _CACHE_POINTER_NAME), "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _pointer_key(pointer):
+    st = os.stat(pointer)
+    return pointer, st.st_mtime_ns, st.st_size, st.st_ino
+
+
 def get_tags_db_path():
-    cache_dir = get_cache_dir()
-    os.makedirs(cache_dir, exist_ok=True)
-    return os.path.join(cache_dir, _CACHE_DB_NAME)
+    """Path of the published cache generation, or None if there is none yet.
+
+    Costs a stat() of the pointer file; the pointer is only read again once that changes.
+    """
+    pointer = os.path.join(get_cache_dir(), _CACHE_POINTER_NAME)
+    try:
+        key = _pointer_key(pointer)
+    except OSError:
+        return None
+    known_key, path = _published["current"]
+    if key != known_key:
+        generation = _current_generation()
+        path = _generation_path(generation) if generation else None
+        if path is not None and not os.path.exists(path):
+            path = None
+        _published["current"] = (key, path)
+    return path
+
+
+def _open_reader(path):
+    # Published generations are never written again, so they stay in rollback-journal mode:
+    # no -wal/-shm sidecars, and an open reader survives its file being pruned on POSIX.
+    uri = "file:" + urllib.request.pathname2url(os.path.abspath(path)) + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    for pragma in (
+            "query_only=ON",
+            f"mmap_size={_READ_MMAP_BYTES}",
+            f"cache_size=-{_READ_CACHE_KIB}",
+            "busy_timeout=5000",
+    ):
+        conn.execute(f"PRAGMA {pragma}")
+    return conn
+
 
+def _close_idle_readers(keep_path=None):
+    """Close pooled connections to any generation other than `keep_path`."""
+    with _read_pool_lock:
+        stale = [conn for path, conn in _read_pool if path != keep_path]
+        _read_pool[:] = [(path, conn) for path, conn in _read_pool if path == keep_path]
+    for conn in stale:
+        conn.close()
 
+
+@contextlib.contextmanager
 def connect():
-    conn = sqlite3.connect(get_tags_db_path())
+    """Read-only connection to the published cache generation, for use in a `with` block.
+
+    Connections come from a small pool and go back to it afterwards, so their page cache stays
+    warm across requests; one whose generation has been superseded is closed instead. Before
+    the first build this is an empty in-memory cache.
+    """
+    path = get_tags_db_path()
+    if path is None:
+        conn = sqlite3.connect(":memory:")
+        try:
+            _create_schema(conn)
+            yield conn
+        finally:
+            conn.close()
+        return
+
+    conn = None
+    with _read_pool_lock:
+        for i, (pooled_path, pooled) in enumerate(_read_pool):
+            if pooled_path == path:
+                conn = pooled
+                del _read_pool[i]
+                break
+    if conn is None:
+        conn = _open_reader(path)
     try:
-        # WAL lets readers keep serving the previous cache while a rebuild is in progress;
-        # busy_timeout absorbs brief lock contention rather than erroring out.
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA busy_timeout=5000")
-    except sqlite3.Error:
-        pass
-    return conn
+        yield conn
+    finally:
+        keep = get_tags_db_path() == path
+        with _read_pool_lock:
+            if keep and len(_read_pool) < _READ_POOL_SIZE:
+                _read_pool.append((path, conn))
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+def _generation_files(cache_dir):
+    """Yield (generation, filename) for every generation file (and sidecar) in the cache dir."""
+    for name in os.listdir(cache_dir):
+        if not name.startswith(_CACHE_DB_PREFIX):
+            continue
+        number = name[len(_CACHE_DB_PREFIX):].split(".", 1)[0]
+        if number.isdigit():
+            yield int(number), name
+
+
+def _next_generation():
+    cache_dir = get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    existing = [g for g, _ in _generation_files(cache_dir)]
+    return max(existing + [_current_generation()]) + 1
+
+
+def _remove_db_files(path):
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass
+
+
+def _publish(generation, previous):
+    """Atomically point readers at `generation`, then prune generations older than `previous`.
+
+    The previous generation is kept so readers that opened it just before the swap can finish;
+    files still held open elsewhere (Windows) are simply retried on the next publish.
+    """
+    cache_dir = get_cache_dir()
+    pointer = os.path.join(cache_dir, _CACHE_POINTER_NAME)
+    tmp = pointer + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(str(generation))
+    os.replace(tmp, pointer)
+    _published["current"] = (_pointer_key(pointer), _generation_path(generation))
+    _close_idle_readers(_generation_path(generation))
+    tag_index.release()
+
+    keep = {generation, previous}
+    for number, name in list(_generation_files(cache_dir)):
+        if number not in keep:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+    _remove_db_files(os.path.join(cache_dir, _LEGACY_DB_NAME))
+    clear_result_cache()
 
 
 def discover_sources():
@@ -144,85 +361,342 @@ def _read_manifest(directory):
     return data, stat.st_mtime
 
 
+def _source_signature(source):
+    """Change marker for a single source: its mtime/size plus its manifest's mtime."""
+    return json.dumps(
+        [round(source["mtime"], 3), source["size"], round(source.get("manifest_mtime", 0), 3)]
+    )
+
+
 def _signature(sources):
     return json.dumps(
-        [
-            [s["source"], round(s["mtime"], 3), s["size"], round(s.get("manifest_mtime", 0), 3)]
-            for s in sources
-        ],
+        {
+            "schema": _SCHEMA_VERSION,
+            "sources": [[s["source"], _source_signature(s)] for s in sources],
+        },
         sort_keys=True,
     )
 
 
-def _create_schema(conn):
+# Substring search index over tags.name (external content, so names are not stored twice).
+_FTS_TABLE = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tags_fts USING fts5(
+        name, content='tags', content_rowid='id', tokenize='trigram'
+    )
+"""
+_FTS_MIN_QUERY = 3  # trigrams: shorter substrings can't use the index
+# Above this many index hits, walking the sort order and testing names reaches a page sooner;
+# a count has to visit every match, so it stays on the index longer before a full scan wins.
+_FTS_PAGE_HITS = 20000
+_FTS_COUNT_HITS = 200000
+
+# Aliases and translations (a record's `words`) are stored normalized in tag_words and matched
+# by prefix; from this many prefix hits on (e.g. a one-letter query) only exact words match,
+# and a word that many tags share is too generic to be searched as an alias at all.
+_WORD_MAX_HITS = 5000
+_WORD_MAX_LEN = 200
+# CJK text has no spaces to split on, so short wide-character words are stored with every
+# suffix as well; a prefix match over those is a substring match (長い髪 is found by 髪).
+_WORD_SUFFIX_MAX_LEN = 16
+
+# Completions for prefixes of up to this many characters are precomputed at rebuild time
+# (tag_prefix_topk): the most popular non-deprecated tags per ASCII-lowercased prefix.
+_PREFIX_TOPK_LEN = 3
+_PREFIX_TOPK = 20
+# An update patches the live generation's prefix index (instead of writing it from all tags)
+# when at most one in this many of its names changed.
+_INDEX_PATCH_RATIO = 32
+# Rows ANALYZE samples per index (PRAGMA analysis_limit): plans only need rough statistics.
+_ANALYSIS_LIMIT = 1000
+
+
+def _fts5_available():
+    try:
+        with contextlib.closing(sqlite3.connect(":memory:")) as conn:
+            conn.execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+# SQLite builds without FTS5 (or older than 3.34) keep the plain LIKE scan.
+_HAS_FTS = _fts5_available()
+
+# Secondary indexes; a full rebuild creates them only after the data is loaded.
+_INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_tags_post ON tags(post_count DESC, name);
+    CREATE INDEX IF NOT EXISTS idx_tags_cat ON tags(category);
+    CREATE INDEX IF NOT EXISTS idx_tags_sources ON tags(source_count DESC, post_count DESC, name);
+    CREATE INDEX IF NOT EXISTS idx_tag_sources_source ON tag_sources(source);
+    CREATE INDEX IF NOT EXISTS idx_tag_facets ON tag_facets(source, is_deprecated, category);
+    CREATE INDEX IF NOT EXISTS idx_tag_words ON tag_words(word, name);
+    CREATE INDEX IF NOT EXISTS idx_tag_words_source ON tag_words(source);
+"""
+
+
+def _create_schema(conn, indexes=True):
     c = conn.cursor()
     c.executescript(
         """
         CREATE TABLE IF NOT EXISTS tags (
-            name TEXT PRIMARY KEY COLLATE NOCASE,
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE,
             post_count INTEGER DEFAULT 0,
             category INTEGER,
             is_deprecated INTEGER DEFAULT 0,
-            metadata TEXT,
-            primary_source TEXT
+            primary_source TEXT,
+            source_count INTEGER DEFAULT 1
         );
-        CREATE INDEX IF NOT EXISTS idx_tags_post ON tags(post_count DESC);
-        CREATE INDEX IF NOT EXISTS idx_tags_cat ON tags(category);
         CREATE TABLE IF NOT EXISTS tag_sources (
             name TEXT NOT NULL COLLATE NOCASE,
             source TEXT NOT NULL,
+            post_count INTEGER DEFAULT 0,
+            category INTEGER,
+            is_deprecated INTEGER DEFAULT 0,
+            meta_block INTEGER,
+            meta_slot INTEGER,
             PRIMARY KEY (name, source)
         );
-        CREATE INDEX IF NOT EXISTS idx_tag_sources_source ON tag_sources(source);
+        CREATE TABLE IF NOT EXISTS tag_metadata (block INTEGER PRIMARY KEY, data BLOB NOT NULL);
+        CREATE TABLE IF NOT EXISTS tag_facets (
+            source TEXT NOT NULL,
+            category INTEGER,
+            is_deprecated INTEGER,
+            n INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tag_prefix_topk (
+            prefix TEXT PRIMARY KEY,
+            tags TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS tag_words (
+            word TEXT NOT NULL,
+            name TEXT NOT NULL COLLATE NOCASE,
+            source TEXT NOT NULL
+        );
         CREATE TABLE IF NOT EXISTS cache_meta (k TEXT PRIMARY KEY, v TEXT);
         """
     )
+    if _HAS_FTS:
+        c.execute(_FTS_TABLE)
+    if indexes:
+        c.executescript(_INDEXES)
     conn.commit()
 
 
+def _bulk_load_pragmas(conn):
+    """Trade durability for speed while building an unpublished generation file.
+
+    Nothing reads the file until it is published, and a build that dies half-way is deleted,
+    so there is no journal, no fsync and the connection keeps the file locked for itself.
+    """
+    for pragma in (
+            "journal_mode=OFF",
+            "synchronous=OFF",
+            "locking_mode=EXCLUSIVE",
+            "temp_store=MEMORY",
+            f"cache_size=-{_BULK_CACHE_KIB}",
+    ):
+        conn.execute(f"PRAGMA {pragma}")
+
+
 def _drop_schema(conn):
     c = conn.cursor()
     c.executescript(
         """
+        DROP TABLE IF EXISTS tags_fts;
         DROP TABLE IF EXISTS tags;
         DROP TABLE IF EXISTS tag_sources;
+        DROP TABLE IF EXISTS tag_metadata;
+        DROP TABLE IF EXISTS tag_facets;
+        DROP TABLE IF EXISTS tag_words;
+        DROP TABLE IF EXISTS tag_prefix_topk;
         DROP TABLE IF EXISTS cache_meta;
         """
     )
     conn.commit()
 
 
-def _iter_records(source):
-    """Yield original tag records (dicts) from a source file, skipping malformed entries."""
+def _iter_records(source, start=0, end=None):
+    """Yield (record, raw) for the original tag records of a source, skipping malformed entries.
+
+    raw is the record's original JSON text (bytes for JSONL) when the source is JSON, else None.
+    start/end restrict a JSONL source to the lines beginning in that byte range.
+    """
     path, fmt = source["abspath"], source["format"]
+    # A file that is still downloading is read through its streamed import (see download_preset).
+    opener = source["follow"].open if source.get("follow") else open
     if fmt == "jsonl":
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    record = json.loads(line)
-                except (ValueError, TypeError):
-                    continue
-                if isinstance(record, dict):
-                    yield record
+        yield from _iter_jsonl_records(path, start, end, opener)
     elif fmt == "csv":
-        yield from _iter_csv_records(path)
+        for record in _iter_csv_records(path, opener):
+            yield record, None
     elif fmt in ("sqlite", "db"):
-        yield from _iter_sqlite_records(source)
+        for record in _iter_sqlite_records(source):
+            yield record, None
     else:
+        yield from _iter_json_records(path)
+
+
+def _json_loads(data):
+    """Parse JSON text or bytes, via orjson when installed (stdlib json for anything it rejects)."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            pass
+    return json.loads(data)
+
+
+def _json_bytes(obj):
+    """Serialize to UTF-8 JSON (non-ASCII kept as-is), via orjson when installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _iter_jsonl_records(path, start=0, end=None, opener=open):
+    """Yield (record, line) for the JSONL lines that begin within [start, end) of the file."""
+    with opener(path, "rb") as f:
+        if start:
+            # The line straddling `start` belongs to the previous range.
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while end is None or pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = _json_loads(line)
+            except (ValueError, TypeError):
+                continue
+            if isinstance(record, dict):
+                yield record, line
+
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Buffer tail that a number decoded just before it might still continue into ("1." + "5e3").
+_JSON_NUMBER_TAIL = re.compile(r"[0-9.eE+\-]*\Z")
+
+
+class _JsonReader:
+    """Pull parser over a JSON text file that decodes one value at a time from a small buffer."""
+
+    def __init__(self, f):
+        self._f = f
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Append the next chunk (dropping consumed text). Returns False at EOF."""
+        if self._eof:
+            return False
+        chunk = self._f.read(_JSON_READ_CHUNK)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            self._pos = _JSON_WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def take(self):
+        """Consume and return the next non-whitespace character ('' at EOF)."""
+        ch = self.peek()
+        self._pos += len(ch)
+        return ch
+
+    def value(self, with_text=False):
+        """Decode the next JSON value (as (value, source_text) if with_text).
+
+        Raises ValueError if the value is malformed or truncated.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                value, end = None, None
+            # No value yet, or a number that may continue in the next chunk: read more.
+            if end is None or _JSON_NUMBER_TAIL.match(self._buf, end):
+                if len(self._buf) - self._pos <= _JSON_MAX_VALUE and self._fill():
+                    continue
+                if end is None:
+                    raise ValueError("malformed JSON value")
+            text = self._buf[self._pos:end] if with_text else None
+            self._pos = end
+            return (value, text) if with_text else value
+
+
+def _iter_json_array(reader):
+    """Yield (element, text) for the dict elements of the array whose '[' is next in `reader`."""
+    reader.take()
+    if reader.peek() == "]":
+        reader.take()
+        return
+    while True:
+        value, text = reader.value(with_text=True)
+        if isinstance(value, dict):
+            yield value, text
+        sep = reader.take()
+        if sep == "]":
+            return
+        if sep != ",":
+            raise ValueError("malformed JSON array")
+
+
+def _iter_json_records(path):
+    """Yield (record, raw) for the records of a .json source one at a time, with bounded memory.
+
+    A top-level array, or the array under a {"tags": [...]} wrapper, is streamed element by
+    element. Any other top-level object is a single record; scalars yield nothing. Parsing
+    stops quietly at the first malformed value.
+    """
+    try:
+        f = open(path, "r", encoding="utf-8")
+    except OSError:
+        return
+    with f:
+        reader = _JsonReader(f)
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except (ValueError, TypeError, OSError):
+            first = reader.peek()
+            if first == "[":
+                yield from _iter_json_array(reader)
+            elif first == "{":
+                reader.take()
+                record = {}
+                sep = "}" if reader.peek() == "}" else ","
+                while sep == ",":
+                    key = reader.value()
+                    if not isinstance(key, str) or reader.take() != ":":
+                        raise ValueError("malformed JSON object")
+                    if key == "tags" and reader.peek() == "[":
+                        yield from _iter_json_array(reader)
+                        return
+                    record[key] = reader.value()
+                    sep = reader.take()
+                if sep != "}":
+                    raise ValueError("malformed JSON object")
+                yield record, None
+        except ValueError:
             return
-        if isinstance(data, dict):
-            data = data.get("tags") if isinstance(data.get("tags"), list) else [data]
-        if isinstance(data, list):
-            for record in data:
-                if isinstance(record, dict):
-                    yield record
 
 
 # Maps assorted CSV header names to our canonical record fields.
@@ -279,9 +753,9 @@ def _csv_row_to_record(row, header):
     return record
 
 
-def _iter_csv_records(path):
+def _iter_csv_records(path, opener=open):
     try:
-        f = open(path, "r", encoding="utf-8", newline="")
+        f = opener(path, "r", encoding="utf-8", newline="")
     except OSError:
         return
     with f:
@@ -382,107 +856,601 @@ def _coerce_int(value, default=0):
         return default
 
 
-def _apply_mapping(record, mapping):
-    """Copy source keys onto canonical fields per a preset's mapping. No-op when mapping is falsy.
+def _mapping_overlay(record, mapping):
+    """Canonical fields taken from source keys per a preset's mapping ({} when mapping is falsy).
 
-    mapping is {canonical_field: source_key}; original keys are kept so metadata stays intact.
+    mapping is {canonical_field: source_key}; the record itself is left untouched.
     """
     if not mapping:
-        return record
-    result = dict(record)
-    for canonical, source_key in mapping.items():
-        if source_key in record and record[source_key] is not None:
-            result[canonical] = record[source_key]
-    return result
+        return {}
+    return {
+        canonical: record[source_key]
+        for canonical, source_key in mapping.items()
+        if record.get(source_key) is not None
+    }
+
 
+def _overlay_delta(record, overlay):
+    """The overlay fields that actually differ (in value or type) from the record."""
+    missing = object()
+    delta = {}
+    for key, value in overlay.items():
+        original = record.get(key, missing)
+        if original is missing or type(original) is not type(value) or original != value:
+            delta[key] = value
+    return delta
 
-def _normalize(record):
-    """Return (tag_row, source_name) for a record, or None if it has no usable name.
 
-    tag_row: (name, post_count, category, is_deprecated, metadata_json)
+def _normalize(record, overlay):
+    """Return (name, post_count, category, is_deprecated) for a record, or None if it has no name.
+
+    Canonical fields come from `overlay` (adapter or mapping output) first, then the record.
     """
-    name = record.get("name")
+    name = overlay["name"] if "name" in overlay else record.get("name")
     if not isinstance(name, str):
         return None
     name = name.strip()
     if not name:
         return None
 
-    post_count = _coerce_int(record.get("post_count"), 0)
-    category = record.get("category")
+    post_count = overlay["post_count"] if "post_count" in overlay else record.get("post_count")
+    post_count = _coerce_int(post_count, 0)
+    category = overlay["category"] if "category" in overlay else record.get("category")
     category = _coerce_int(category, None) if category is not None else None
-    is_deprecated = 1 if record.get("is_deprecated") else 0
-    metadata_json = json.dumps(record, ensure_ascii=False)
-    return name, post_count, category, is_deprecated, metadata_json
+    deprecated = overlay["is_deprecated"] if "is_deprecated" in overlay else record.get("is_deprecated")
+    is_deprecated = 1 if deprecated else 0
+    return name, post_count, category, is_deprecated
+
 
+def _normalize_word(text):
+    """Search form of a name, alias or query: NFKC (full-/half-width forms), casefolded,
+    underscores as spaces and whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().replace("_", " ").split())
 
-_UPSERT_TAG = """
-    INSERT INTO tags (name, post_count, category, is_deprecated, metadata, primary_source)
-    VALUES (?, ?, ?, ?, ?, ?)
-    ON CONFLICT(name) DO UPDATE SET
+
+def _record_words(record, overlay, name):
+    """A record's aliases/translations in search form, minus any the name already contains.
+
+    Short words with wide (CJK) characters also contribute their suffixes.
+    """
+    words = overlay["words"] if "words" in overlay else record.get("words")
+    if isinstance(words, str):
+        words = _split_aliases(words)
+    if not isinstance(words, (list, tuple)):
+        return ()
+    key = _normalize_word(name)
+    out = []
+    for word in words:
+        if not isinstance(word, str):
+            continue
+        word = _normalize_word(word)[:_WORD_MAX_LEN]
+        forms = [word]
+        if len(word) <= _WORD_SUFFIX_MAX_LEN and any(
+                unicodedata.east_asian_width(ch) == "W" for ch in word):
+            forms = [word[i:] for i in range(len(word)) if word[i] != " "]
+        for form in forms:
+            if form and form not in key and form not in out:
+                out.append(form)
+    return out
+
+
+# Within one source a repeated name keeps its highest-post_count record (first one on ties).
+_UPSERT_SOURCE_ROW = """
+    INSERT INTO tag_sources
+        (name, source, post_count, category, is_deprecated, meta_block, meta_slot)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(name, source) DO UPDATE SET
         post_count = excluded.post_count,
         category = excluded.category,
         is_deprecated = excluded.is_deprecated,
-        metadata = excluded.metadata,
-        primary_source = excluded.primary_source
-    WHERE excluded.post_count > tags.post_count
+        meta_block = excluded.meta_block,
+        meta_slot = excluded.meta_slot
+    WHERE excluded.post_count > tag_sources.post_count
 """
 
-_INSERT_SOURCE = "INSERT OR IGNORE INTO tag_sources (name, source) VALUES (?, ?)"
+# Across sources the winner is the max post_count, ties going to the first source by name.
+# The same pass counts how many sources carry the name.
+_INSERT_WINNERS = """
+    INSERT INTO tags (name, post_count, category, is_deprecated, primary_source, source_count)
+    SELECT name, post_count, category, is_deprecated, source, source_count FROM (
+        SELECT s.name, s.post_count, s.category, s.is_deprecated, s.source,
+               ROW_NUMBER() OVER (
+                   PARTITION BY s.name ORDER BY s.post_count DESC, s.source ASC
+               ) AS rn,
+               COUNT(*) OVER (PARTITION BY s.name) AS source_count
+        FROM tag_sources s{where}
+    )
+    WHERE rn = 1
+"""
 
 
-def _rebuild(conn, sources, progress_cb=None):
-    _drop_schema(conn)
-    _create_schema(conn)
-    c = conn.cursor()
+# Tag counts per (source, category, is_deprecated), using the winning row's category and
+# deprecation like the browser's filters do; source '' counts the whole tags table. Rebuilt
+# from scratch by a full import, adjusted by {sign}1 per (name, source) row otherwise.
+_FACET_ALL = "SELECT name, source FROM tag_sources"
+_FACET_ROWS = """
+    SELECT '', t.category, t.is_deprecated, {sign}COUNT(*) FROM tags t{where}
+    GROUP BY t.category, t.is_deprecated
+    UNION ALL
+    SELECT s.source, t.category, t.is_deprecated, {sign}COUNT(*)
+    FROM ({rows}) s JOIN tags t ON t.name = s.name
+    GROUP BY s.source, t.category, t.is_deprecated
+"""
 
-    processed = 0
-    for source in sources:
-        source_name = source["source"]
-        mapping = source.get("mapping")
-        transform = source.get("transform")
-        tag_batch = []
-        src_batch = []
-        for record in _iter_records(source):
-            if transform is not None:
-                record = transform(record)
-                if record is None:
-                    continue
-            record = _apply_mapping(record, mapping)
-            normalized = _normalize(record)
-            if normalized is None:
+
+def _source_rows(source, items):
+    """Turn a source's (record, raw) items into tag_sources rows plus their metadata record.
+
+    Yields (name, source, post_count, category, is_deprecated, metadata, words). When the original
+    JSON text is at hand it is kept verbatim, with an overlay of only the canonical fields the
+    adapter/mapping changed; otherwise the merged record is serialized. get_tag_detail
+    reassembles either form on demand.
+    """
+    source_name = source["source"]
+    mapping = source.get("mapping")
+    transform = source.get("transform")
+    for record, raw in items:
+        if transform is not None:
+            overlay = transform(record)
+            if overlay is None:
                 continue
-            name, post_count, category, is_deprecated, metadata_json = normalized
-            tag_batch.append((name, post_count, category, is_deprecated, metadata_json, source_name))
-            src_batch.append((name, source_name))
-
-            if len(tag_batch) >= _IMPORT_BATCH:
-                c.executemany(_UPSERT_TAG, tag_batch)
-                c.executemany(_INSERT_SOURCE, src_batch)
-                processed += len(tag_batch)
-                tag_batch.clear()
-                src_batch.clear()
-                if progress_cb:
-                    progress_cb(processed)
-
-        if tag_batch:
-            c.executemany(_UPSERT_TAG, tag_batch)
-            c.executemany(_INSERT_SOURCE, src_batch)
-            processed += len(tag_batch)
+        else:
+            overlay = _mapping_overlay(record, mapping)
+        normalized = _normalize(record, overlay)
+        if normalized is None:
+            continue
+        overlay = _overlay_delta(record, overlay)
+        if raw is None:
+            metadata = _META_OVERLAY_SEP + _json_bytes({**record, **overlay} if overlay else record)
+        else:
+            if isinstance(raw, str):
+                raw = raw.encode("utf-8")
+            metadata = (_json_bytes(overlay) if overlay else b"") + _META_OVERLAY_SEP + raw
+        name, post_count, category, is_deprecated = normalized
+        words = _record_words(record, overlay, name)
+        yield name, source_name, post_count, category, is_deprecated, metadata, words
+
+
+def _pack_blocks(rows):
+    """Group _source_rows output into metadata blocks.
+
+    Yields (compressed_block, block_rows, word_rows). block_rows are the rows without their
+    metadata, a row's slot being its index in the block; word_rows are (word, name, source).
+    """
+    block_rows, records, word_rows = [], [], []
+    for row in rows:
+        block_rows.append(row[:5])
+        records.append(row[5])
+        word_rows.extend((word, row[0], row[1]) for word in row[6])
+        if len(records) >= _META_BLOCK:
+            yield zlib.compress(_META_RECORD_SEP.join(records)), block_rows, word_rows
+            block_rows, records, word_rows = [], [], []
+    if records:
+        yield zlib.compress(_META_RECORD_SEP.join(records)), block_rows, word_rows
+
+
+def _unpack_metadata(block, slot):
+    """Parse one record's metadata (original JSON + overlay) out of a compressed block."""
+    record = zlib.decompress(block).split(_META_RECORD_SEP)[slot]
+    overlay, _, raw = record.partition(_META_OVERLAY_SEP)
+    metadata = _json_loads(raw)
+    if overlay:
+        metadata.update(_json_loads(overlay))
+    return metadata
+
+
+def _plan_tasks(sources):
+    """Split sources into ordered work units (source, start, end, parallel).
+
+    Large JSONL files are cut into byte ranges; small json/csv files are one unit each. Both
+    may run in the process pool. Big json/csv and SQLite sources are read by the writer
+    itself, since their rows can't be split and would otherwise be shipped back in one piece,
+    and so is a file still being downloaded.
+    """
+    tasks = []
+    for source in sources:
+        size = source.get("size") or 0
+        if source.get("follow") is not None:
+            # Still downloading: the writer reads it front to back as the bytes arrive.
+            tasks.append((source, 0, None, False))
+        elif source["format"] == "jsonl":
+            starts = list(range(0, max(size, 1), _PARALLEL_CHUNK))
+            for i, start in enumerate(starts):
+                # The last range is open-ended so lines appended since discovery still count.
+                end = starts[i + 1] if i + 1 < len(starts) else None
+                tasks.append((source, start, end, True))
+        else:
+            parallel = source["format"] in ("json", "csv") and size <= _PARALLEL_CHUNK
+            tasks.append((source, 0, None, parallel))
+    return tasks
+
+
+def _task_blocks(task):
+    """Process-pool entry point: parse one work unit into a list of packed metadata blocks."""
+    source, start, end, _ = task
+    return list(_pack_blocks(_source_rows(source, _iter_records(source, start, end))))
+
+
+def _start_pool(tasks):
+    """Return a process pool for the parallel units, or None when a serial import is cheaper."""
+    if _IMPORT_WORKERS < 2:
+        return None
+    parallel_bytes = 0
+    for source, start, end, parallel in tasks:
+        if parallel:
+            size = source.get("size") or 0
+            parallel_bytes += max(0, min(end or size, size) - start)
+    if parallel_bytes < _PARALLEL_MIN_BYTES:
+        return None
+    pool = None
+    try:
+        # spawn: forking the threaded WebUI process is not safe. The initializer is stdlib, so
+        # a child can unpickle and run it before this module is importable there.
+        pool = ProcessPoolExecutor(
+            max_workers=_IMPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+            initializer=site.addsitedir, initargs=(_EXTENSION_ROOT,),
+        )
+        with _without_host_main():
+            # Start every worker now; the pool would start them on demand, after __main__ is
+            # back. Each sleeps a moment so no worker is idle (and reused) before all exist.
+            for _ in range(_IMPORT_WORKERS):
+                pool.submit(time.sleep, 0.1)
+        return pool
+    except (OSError, ValueError, NotImplementedError):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return None
+
+
+@contextlib.contextmanager
+def _without_host_main():
+    """Hide the host's __main__ (the WebUI's launch script) while spawning processes, which
+    would otherwise re-run that whole script in every child before it takes any work."""
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def _import_sources(c, sources, progress_cb=None, indexed=True):
+    """Upsert the records of `sources` into tag_sources/tag_metadata. Returns rows written.
+
+    Workers parse, transform, normalize and compress work units; this thread is the only
+    writer and applies units strictly in plan order (at most a small window ahead is in
+    flight), so the result is identical to a serial import. A broken pool falls back to
+    parsing inline. Without the source index (bulk load), unreferenced metadata blocks are
+    swept once at the end instead of per source.
+    """
+    tasks = _plan_tasks(sources)
+    pool = _start_pool(tasks)
+    window = _IMPORT_WORKERS * 2
+    futures = {}
+    next_parallel = 0
+    processed = 0
+    c.execute("SELECT COALESCE(MAX(block), 0) + 1 FROM tag_metadata")
+    next_block = c.fetchone()[0]
+    block_batch, row_batch, word_batch = [], [], []
+
+    def fill_window():
+        nonlocal next_parallel
+        while pool is not None and len(futures) < window and next_parallel < len(tasks):
+            if tasks[next_parallel][3]:
+                futures[next_parallel] = pool.submit(_task_blocks, tasks[next_parallel])
+            next_parallel += 1
+
+    def flush():
+        nonlocal processed
+        if row_batch:
+            c.executemany("INSERT INTO tag_metadata (block, data) VALUES (?, ?)", block_batch)
+            c.executemany(_UPSERT_SOURCE_ROW, row_batch)
+            c.executemany("INSERT INTO tag_words (word, name, source) VALUES (?, ?, ?)", word_batch)
+            processed += len(row_batch)
+            block_batch.clear()
+            row_batch.clear()
+            word_batch.clear()
             if progress_cb:
                 progress_cb(processed)
 
-    c.execute(
-        "INSERT OR REPLACE INTO cache_meta (k, v) VALUES ('signature', ?)",
-        (_signature(sources),),
+    def finish_source(source_name, first_block, written):
+        # A name repeated within the source keeps only one row; drop blocks nothing points at.
+        flush()
+        if not indexed:
+            return
+        c.execute("SELECT COUNT(*) FROM tag_sources WHERE source = ?", (source_name,))
+        if c.fetchone()[0] < written:
+            c.execute(
+                """
+                DELETE FROM tag_metadata WHERE block >= ? AND block < ? AND block NOT IN (
+                    SELECT meta_block FROM tag_sources WHERE source = ?
+                )
+                """,
+                (first_block, next_block, source_name),
+            )
+
+    current, first_block, written = None, next_block, 0
+    try:
+        for index, task in enumerate(tasks):
+            source = task[0]
+            if source is not current:
+                if current is not None:
+                    finish_source(current["source"], first_block, written)
+                current, first_block, written = source, next_block, 0
+
+            fill_window()
+            blocks = None
+            future = futures.pop(index, None)
+            if future is not None:
+                try:
+                    blocks = future.result()
+                except BrokenProcessPool:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = None
+                    futures.clear()
+            if blocks is None:
+                _, start, end, _ = task
+                blocks = _pack_blocks(_source_rows(source, _iter_records(source, start, end)))
+
+            for data, rows, words in blocks:
+                block_batch.append((next_block, data))
+                word_batch.extend(words)
+                for slot, row in enumerate(rows):
+                    row_batch.append(row + (next_block, slot))
+                next_block += 1
+                written += len(rows)
+                if len(row_batch) >= _IMPORT_BATCH:
+                    flush()
+        if current is not None:
+            finish_source(current["source"], first_block, written)
+        if not indexed:
+            c.execute("SELECT COUNT(*) FROM tag_sources")
+            if c.fetchone()[0] < processed:
+                c.execute(
+                    "DELETE FROM tag_metadata WHERE block NOT IN "
+                    "(SELECT meta_block FROM tag_sources)"
+                )
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+    return processed
+
+
+def _stored_source_signatures(conn):
+    """Return {source: signature} for the imported sources, or None if the layout is outdated."""
+    c = conn.cursor()
+    try:
+        c.execute("SELECT v FROM cache_meta WHERE k = 'schema'")
+        row = c.fetchone()
+        if not row or row[0] != _SCHEMA_VERSION:
+            return None
+        c.execute(
+            "SELECT k, v FROM cache_meta WHERE k LIKE ?", (_SOURCE_SIG_PREFIX + "%",)
+        )
+    except sqlite3.OperationalError:
+        return None
+    return {k[len(_SOURCE_SIG_PREFIX):]: v for k, v in c.fetchall()}
+
+
+def _merge_facets(c, delta):
+    """Add (source, category, is_deprecated, n) deltas into tag_facets, dropping zero counts."""
+    totals = {}
+    c.execute("SELECT source, category, is_deprecated, n FROM tag_facets")
+    for source, category, is_deprecated, n in c.fetchall() + delta:
+        key = (source, category, is_deprecated)
+        totals[key] = totals.get(key, 0) + n
+    c.execute("DELETE FROM tag_facets")
+    c.executemany(
+        "INSERT INTO tag_facets (source, category, is_deprecated, n) VALUES (?, ?, ?, ?)",
+        [key + (n,) for key, n in totals.items() if n],
     )
-    c.execute(
-        "INSERT OR REPLACE INTO cache_meta (k, v) VALUES ('imported_at', ?)",
-        (str(time.time()),),
+
+
+def _prefix_key(text):
+    return text.encode("utf-8").lower().decode("utf-8")  # ASCII-only, like SQLite's lower()
+
+
+def _store_prefix_topk(conn, topk, patch=False):
+    """Replace tag_prefix_topk with `topk` ({prefix: [[name, post_count, category], ...]}),
+    or with `patch` only the rows of its prefixes (an empty list removes a prefix's row)."""
+    c = conn.cursor()
+    if patch:
+        c.executemany("DELETE FROM tag_prefix_topk WHERE prefix = ?", ((p,) for p in topk))
+    else:
+        c.execute("DELETE FROM tag_prefix_topk")
+    c.executemany(
+        "INSERT INTO tag_prefix_topk (prefix, tags) VALUES (?, ?)",
+        ((prefix, json.dumps(tags, ensure_ascii=False)) for prefix, tags in topk.items() if tags),
     )
     conn.commit()
 
 
+def _apply_sources(conn, sources, progress_cb=None):
+    """Make the cache in `conn` match `sources`, re-importing only the sources that changed.
+
+    Removed or changed sources have their rows deleted, added or changed ones are imported,
+    and the winning row in `tags` is recomputed only for the names those sources touch.
+    An empty or outdated cache is dropped and imported from scratch.
+
+    Returns None after a full import, else the touched names as (name, tag) pairs, tag being
+    the name's (name, post_count, category) now or None if it is gone or deprecated.
+    """
+    stored = _stored_source_signatures(conn)
+    full = stored is None
+    if full:
+        _drop_schema(conn)
+        _create_schema(conn, indexes=False)
+        stored = {}
+
+    current = {s["source"]: _source_signature(s) for s in sources}
+    stale = [name for name, sig in stored.items() if current.get(name) != sig]
+    fresh = [s for s in sources if stored.get(s["source"]) != current[s["source"]]]
+
+    c = conn.cursor()
+    if not full:
+        # Names whose winner may change: every name a stale or fresh source held.
+        c.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS affected_names (name TEXT PRIMARY KEY COLLATE NOCASE)"
+        )
+        c.execute("DELETE FROM affected_names")
+        # Rows of stale sources, still needed to take their share back out of tag_facets.
+        c.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS removed_rows (name TEXT COLLATE NOCASE, source TEXT)"
+        )
+        c.execute("DELETE FROM removed_rows")
+
+    for source_name in stale:
+        if not full:
+            c.execute(
+                "INSERT OR IGNORE INTO affected_names SELECT name FROM tag_sources WHERE source = ?",
+                (source_name,),
+            )
+            c.execute(
+                "INSERT INTO removed_rows SELECT name, source FROM tag_sources WHERE source = ?",
+                (source_name,),
+            )
+        c.execute(
+            "DELETE FROM tag_metadata WHERE block IN "
+            "(SELECT meta_block FROM tag_sources WHERE source = ?)",
+            (source_name,),
+        )
+        c.execute("DELETE FROM tag_sources WHERE source = ?", (source_name,))
+        c.execute("DELETE FROM tag_words WHERE source = ?", (source_name,))
+        c.execute("DELETE FROM cache_meta WHERE k = ?", (_SOURCE_SIG_PREFIX + source_name,))
+
+    _import_sources(c, fresh, progress_cb=progress_cb, indexed=not full)
+    for source in fresh:
+        if not full:
+            c.execute(
+                "INSERT OR IGNORE INTO affected_names SELECT name FROM tag_sources WHERE source = ?",
+                (source["source"],),
+            )
+        # Taken after the import: a streamed download only has its final size/mtime by now.
+        c.execute(
+            "INSERT OR REPLACE INTO cache_meta (k, v) VALUES (?, ?)",
+            (_SOURCE_SIG_PREFIX + source["source"], _source_signature(source)),
+        )
+
+    if full:
+        c.execute(_INSERT_WINNERS.format(where=""))
+        if _HAS_FTS:
+            c.execute("INSERT INTO tags_fts(tags_fts) VALUES ('rebuild')")
+        c.execute("INSERT INTO tag_facets " + _FACET_ROWS.format(sign="", where="", rows=_FACET_ALL))
+        conn.commit()
+        c.executescript(_INDEXES)
+    else:
+        # Facet counts of the affected names before (the old winners with their old rows: kept
+        # rows of untouched sources plus the removed ones) and after the winners are redone.
+        in_affected = " WHERE t.name IN (SELECT name FROM affected_names)"
+        affected_rows = (
+            "SELECT name, source FROM tag_sources WHERE name IN (SELECT name FROM affected_names)"
+        )
+        c.execute(
+            _FACET_ROWS.format(
+                sign="-", where=in_affected,
+                rows=f"{affected_rows} AND source NOT IN (SELECT value FROM json_each(?)) "
+                     "UNION ALL SELECT name, source FROM removed_rows",
+            ),
+            (json.dumps([source["source"] for source in fresh]),),
+        )
+        delta = c.fetchall()
+
+        # External-content FTS rows are removed with the old values before the rows go.
+        affected = "SELECT id, name FROM tags WHERE name IN (SELECT name FROM affected_names)"
+        if _HAS_FTS:
+            c.execute(
+                f"INSERT INTO tags_fts(tags_fts, rowid, name) SELECT 'delete', id, name FROM ({affected})"
+            )
+        c.execute("DELETE FROM tags WHERE name IN (SELECT name FROM affected_names)")
+        c.execute(_INSERT_WINNERS.format(
+            where=" WHERE s.name IN (SELECT name FROM affected_names)"
+        ))
+        if _HAS_FTS:
+            c.execute(f"INSERT INTO tags_fts(rowid, name) {affected}")
+        c.execute(_FACET_ROWS.format(sign="", where=in_affected, rows=affected_rows))
+        delta += c.fetchall()
+        _merge_facets(c, delta)
+        c.execute(
+            """
+            SELECT a.name, t.name, t.post_count, t.category FROM affected_names a
+            LEFT JOIN tags t ON t.name = a.name AND t.is_deprecated = 0
+            """
+        )
+        changed = [(name, None if tag[0] is None else tag) for name, *tag in c.fetchall()]
+        c.execute("DELETE FROM affected_names")
+        c.execute("DELETE FROM removed_rows")
+
+    for key, value in (
+            ("schema", _SCHEMA_VERSION),
+            ("signature", _signature(sources)),
+            ("imported_at", str(time.time())),
+    ):
+        c.execute("INSERT OR REPLACE INTO cache_meta (k, v) VALUES (?, ?)", (key, value))
+    conn.commit()
+    # Statistics from a bounded sample per index; an update only refreshes what drifted.
+    c.execute(f"PRAGMA analysis_limit = {_ANALYSIS_LIMIT}")
+    if full:
+        c.execute("ANALYZE")
+    c.execute("PRAGMA optimize")
+    return None if full else changed
+
+
+def _rebuild(sources, progress_cb=None):
+    """Build the next cache generation beside the live one and publish it once complete.
+
+    The live generation is copied first (when its layout is current) so the update stays
+    incremental; readers keep using the live file until the pointer swap. The shadow file is
+    written in bulk-load mode (see _bulk_load_pragmas) and published with a normal journal.
+    An update that changes few names patches the live prefix index rather than rewriting it.
+    """
+    previous = _current_generation()
+    live = get_tags_db_path()
+    if live is not None:
+        with connect() as live_conn:
+            if _stored_source_signatures(live_conn) is None:
+                live = None  # outdated layout: nothing worth copying
+
+    generation = _next_generation()
+    path = _generation_path(generation)
+    _remove_db_files(path)
+    index_path = _index_path(path)
+    conn = None
+    try:
+        if live is not None:
+            # Published generations are never written again, so a file copy is consistent; it
+            # is a kernel-side copy (or a clone on copy-on-write filesystems), unlike backup().
+            shutil.copyfile(live, path)
+        conn = sqlite3.connect(path)
+        _bulk_load_pragmas(conn)
+        changed = _apply_sources(conn, sources, progress_cb=progress_cb)
+        old_index = None
+        if live is not None and changed is not None:
+            old_index = tag_index.load(_index_path(live))
+        if old_index is not None and len(changed) * _INDEX_PATCH_RATIO <= old_index["count"]:
+            # Few names changed: patch the live index and the top-k of their prefixes.
+            _store_prefix_topk(conn, tag_index.patch_index(
+                old_index, index_path, changed, prefix_len=_PREFIX_TOPK_LEN, topk=_PREFIX_TOPK
+            ), patch=True)
+        else:
+            # The index pass also yields the short-prefix top-k that complete_tags reads.
+            _store_prefix_topk(conn, tag_index.write_index(
+                conn, index_path, prefix_len=_PREFIX_TOPK_LEN, topk=_PREFIX_TOPK
+            ))
+    except BaseException:
+        if conn is not None:
+            conn.close()
+        _remove_db_files(path)
+        for leftover in (index_path, index_path + ".tmp"):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+        raise
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+    _publish(generation, previous)
+
+
 def _stored_signature(conn):
     try:
         c = conn.cursor()
@@ -501,44 +1469,229 @@ def cache_status():
     sources = discover_sources()
     sig = _signature(sources)
     with connect() as conn:
-        _create_schema(conn)
         stored = _stored_signature(conn)
-    return {"needs_rebuild": stored != sig, "source_count": len(sources)}
+    return {"needs_rebuild": stored != sig, "source_count": len(sources),
+            "result_cache": result_cache_stats()}
+
+
+def has_tags():
+    """Whether the published cache holds any tag (False until a dataset has been imported)."""
+    if get_tags_db_path() is None:
+        return False
+    with connect() as conn:
+        return conn.execute("SELECT 1 FROM tags LIMIT 1").fetchone() is not None
+
+
+def invalidate_sources():
+    """Make the next ensure_cache() re-scan datasets/ (call after changing files in it)."""
+    _sources_checked["until"] = 0.0
+
+
+def _mark_sources_checked(datasets_dir):
+    _sources_checked.update(dir=datasets_dir, until=time.monotonic() + _SOURCES_CHECK_TTL)
 
 
 def ensure_cache(progress_cb=None):
-    """Idempotently make the cache match the current sources on disk. Rebuilds only on change."""
+    """Idempotently make the cache match the current sources on disk. Rebuilds only on change.
+
+    Within _SOURCES_CHECK_TTL of a successful check this returns without touching datasets/.
+    """
+    datasets_dir = get_datasets_dir()
+    if (_sources_checked["dir"] == datasets_dir
+            and time.monotonic() < _sources_checked["until"]):
+        return
     sources = discover_sources()
     sig = _signature(sources)
     with connect() as conn:
-        _create_schema(conn)
         if _stored_signature(conn) == sig:
+            _mark_sources_checked(datasets_dir)
             return
 
-    # Only one rebuild at a time; concurrent callers keep serving the current cache.
+    # Only one rebuild at a time; concurrent callers keep serving the current generation.
     if not _rebuild_lock.acquire(blocking=False):
         return
     try:
         with connect() as conn:
             if _stored_signature(conn) == sig:
+                _mark_sources_checked(datasets_dir)
                 return
-            _rebuild(conn, sources, progress_cb=progress_cb)
+        _rebuild(sources, progress_cb=progress_cb)
+        _mark_sources_checked(datasets_dir)
     finally:
         _rebuild_lock.release()
 
 
+# ---------------------------------------------------------------------------
+# Query result cache
+# ---------------------------------------------------------------------------
+
+def clear_result_cache():
+    with _result_cache_lock:
+        _result_cache.clear()
+        _result_cache_stats["bytes"] = 0
+
+
+def result_cache_stats():
+    """Hit/miss counters and current size of the query result cache."""
+    with _result_cache_lock:
+        return dict(_result_cache_stats, entries=len(_result_cache))
+
+
+def _copy_result(value):
+    # Rows are handed to callers as fresh dicts so nobody can edit a cached entry.
+    return [dict(row) for row in value] if isinstance(value, list) else value
+
+
+def _cached_result(fn):
+    """Serve repeated calls of a read-only query from the result cache."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (fn.__name__, get_cache_dir(), get_tags_db_path(), args,
+               tuple(sorted(kwargs.items())))
+        with _result_cache_lock:
+            entry = _result_cache.get(key)
+            if entry is not None:
+                _result_cache.move_to_end(key)
+                _result_cache_stats["hits"] += 1
+                return _copy_result(entry[0])
+            _result_cache_stats["misses"] += 1
+
+        value = fn(*args, **kwargs)
+        size = len(json.dumps(value, default=str))
+        if size <= _RESULT_CACHE_BYTES // 8:
+            with _result_cache_lock:
+                old = _result_cache.pop(key, None)
+                if old is not None:
+                    _result_cache_stats["bytes"] -= old[1]
+                _result_cache[key] = (_copy_result(value), size)
+                _result_cache_stats["bytes"] += size
+                while _result_cache_stats["bytes"] > _RESULT_CACHE_BYTES:
+                    _, (_, evicted) = _result_cache.popitem(last=False)
+                    _result_cache_stats["bytes"] -= evicted
+        return value
+    return wrapper
+
+
 # ---------------------------------------------------------------------------
 # Queries
 # ---------------------------------------------------------------------------
 
+# Sort keys (column, descending); each ends in the unique name so cursors are unambiguous.
 _SORTS = {
-    "post_count": "t.post_count DESC, t.name ASC",
-    "name": "t.name ASC",
-    "post_count_asc": "t.post_count ASC, t.name ASC",
+    "post_count": (("post_count", True), ("name", False)),
+    "name": (("name", False),),
+    "post_count_asc": (("post_count", False), ("name", False)),
+    "source_count": (("source_count", True), ("post_count", True), ("name", False)),
 }
 
 
-def _build_filters(q, category, source, include_deprecated):
+def tag_cursor(tag, sort="post_count"):
+    """Opaque cursor for the page after `tag` (a query_tags row) in the given sort."""
+    if sort not in _SORTS:
+        sort = "post_count"
+    keys = _SORTS[sort]
+    data = json.dumps([sort] + [tag[column] for column, _ in keys], ensure_ascii=False)
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _cursor_filter(cursor, sort):
+    """SQL condition selecting the rows after `cursor`. Raises ValueError for a bad cursor.
+
+    The leading key also gets a plain range check so SQLite can seek on the sort's index.
+    """
+    keys = _SORTS[sort]
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor") from None
+    if not isinstance(values, list) or values[:1] != [sort] or len(values) != len(keys) + 1:
+        raise ValueError("Cursor does not match this sort")
+    values = values[1:]
+    if not all(isinstance(v, (str, int, float)) for v in values):
+        raise ValueError("Invalid cursor")
+
+    terms, params = [], []
+    for i, (column, desc) in enumerate(keys):
+        parts = [f"t.{keys[j][0]} = ?" for j in range(i)] + [f"t.{column} {'<' if desc else '>'} ?"]
+        terms.append("(" + " AND ".join(parts) + ")")
+        params.extend(values[:i + 1])
+    column, desc = keys[0]
+    condition = f"t.{column} {'<=' if desc else '>='} ? AND ({' OR '.join(terms)})"
+    return condition, [values[0]] + params
+
+
+def _like_literal(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _fts_hits(conn, phrase, cap):
+    """Number of names the trigram index matches for `phrase`, counting no further than cap."""
+    return conn.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM tags_fts WHERE tags_fts MATCH ? LIMIT ?)",
+        (phrase, cap),
+    ).fetchone()[0]
+
+
+def _word_hits(conn, condition, params):
+    return conn.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM tag_words WHERE {condition} LIMIT ?)",
+        params + [_WORD_MAX_HITS],
+    ).fetchone()[0]
+
+
+def _word_filter(conn, q):
+    """SQL condition (and params) for tags with an alias/translation starting with `q`, or None.
+
+    The names come from one seek on idx_tag_words. A prefix shared by very many words (a single
+    letter or kana) narrows to words equal to `q`; a word that is itself that common is not
+    matched. The route depends only on the data, so pages and counts agree.
+    """
+    word = _normalize_word(q)
+    if not word:
+        return None
+    for condition, params in (
+            ("word >= ? AND word < ?", [word, word + "\U0010ffff"]),
+            ("word = ?", [word]),
+    ):
+        hits = _word_hits(conn, condition, params)
+        if not hits:
+            return None
+        if hits < _WORD_MAX_HITS:
+            return f"t.name IN (SELECT name FROM tag_words WHERE {condition})", params
+    return None
+
+
+def _name_filter(conn, q, max_hits):
+    """SQL condition (and params) matching tags whose name contains `q` or whose alias or
+    translation starts with it (see _word_filter).
+
+    Selective substrings are looked up in the trigram index; from `max_hits` index hits on,
+    the plain scan is kept (it can walk idx_tags_post and stop at the page limit).
+    The LIKE check stays in both cases so the results don't depend on the route taken.
+    """
+    condition, params = "t.name LIKE ? ESCAPE '\\'", [f"%{_like_literal(q)}%"]
+    if _HAS_FTS and len(q) >= _FTS_MIN_QUERY:
+        phrase = _fts_phrase(q)
+        try:
+            hits = _fts_hits(conn, phrase, max_hits)
+        except sqlite3.OperationalError:
+            hits = max_hits
+        if hits < max_hits:
+            condition = "t.id IN (SELECT rowid FROM tags_fts WHERE tags_fts MATCH ?) AND " + condition
+            params = [phrase] + params
+    words = _word_filter(conn, q)
+    if words is None:
+        return condition, params
+    return f"({condition} OR {words[0]})", params + words[1]
+
+
+def _build_filters(conn, q, category, source, include_deprecated, min_sources=None,
+                   max_hits=_FTS_PAGE_HITS):
     joins = ""
     where = []
     params = []
@@ -547,11 +1700,15 @@ def _build_filters(q, category, source, include_deprecated):
         joins = " JOIN tag_sources s ON s.name = t.name AND s.source = ?"
         params.append(source)
     if q:
-        where.append("t.name LIKE ?")
-        params.append(f"%{q}%")
+        condition, values = _name_filter(conn, q, max_hits)
+        where.append(condition)
+        params.extend(values)
     if category is not None:
         where.append("t.category = ?")
         params.append(category)
+    if min_sources and min_sources > 1:
+        where.append("t.source_count >= ?")
+        params.append(min_sources)
     if not include_deprecated:
         where.append("t.is_deprecated = 0")
 
@@ -559,19 +1716,32 @@ def _build_filters(q, category, source, include_deprecated):
     return joins, clause, params
 
 
+@_cached_result
 def query_tags(q=None, category=None, source=None, include_deprecated=False,
-               sort="post_count", limit=60, offset=0):
-    joins, clause, params = _build_filters(q, category, source, include_deprecated)
-    order = _SORTS.get(sort, _SORTS["post_count"])
+               min_sources=None, sort="post_count", limit=60, offset=0, cursor=None):
+    """One page of tags.
 
-    sql = f"""
-        SELECT t.name, t.post_count, t.category, t.is_deprecated,
-               (SELECT COUNT(*) FROM tag_sources ts WHERE ts.name = t.name) AS source_count
-        FROM tags t{joins}{clause}
-        ORDER BY {order}
-        LIMIT ? OFFSET ?
+    With a `cursor` (from tag_cursor) the page starts right after the row it encodes and
+    `offset` is ignored, so deep pages cost the same as the first one.
     """
+    if sort not in _SORTS:
+        sort = "post_count"
+    order = ", ".join(f"t.{column} {'DESC' if desc else 'ASC'}" for column, desc in _SORTS[sort])
     with connect() as conn:
+        joins, clause, params = _build_filters(
+            conn, q, category, source, include_deprecated, min_sources=min_sources
+        )
+        if cursor:
+            condition, values = _cursor_filter(cursor, sort)
+            clause = (clause + " AND " if clause else " WHERE ") + condition
+            params = params + values
+            offset = 0
+        sql = f"""
+            SELECT t.name, t.post_count, t.category, t.is_deprecated, t.source_count
+            FROM tags t{joins}{clause}
+            ORDER BY {order}
+            LIMIT ? OFFSET ?
+        """
         c = conn.cursor()
         c.execute(sql, params + [limit, offset])
         return [
@@ -586,36 +1756,113 @@ def query_tags(q=None, category=None, source=None, include_deprecated=False,
         ]
 
 
-def count_tags(q=None, category=None, source=None, include_deprecated=False):
-    joins, clause, params = _build_filters(q, category, source, include_deprecated)
-    sql = f"SELECT COUNT(*) FROM tags t{joins}{clause}"
+def _facet_filters(category, source, include_deprecated):
+    """WHERE clause over tag_facets equivalent to _build_filters without q / min_sources."""
+    where = ["f.source = ?"]
+    params = [source or ""]
+    if category is not None:
+        where.append("f.category = ?")
+        params.append(category)
+    if not include_deprecated:
+        where.append("f.is_deprecated = 0")
+    return " WHERE " + " AND ".join(where), params
+
+
+@_cached_result
+def count_tags(q=None, category=None, source=None, include_deprecated=False, min_sources=None):
+    if not q and not (min_sources and min_sources > 1):
+        clause, params = _facet_filters(category, source, include_deprecated)
+        with connect() as conn:
+            return conn.execute(
+                f"SELECT COALESCE(SUM(f.n), 0) FROM tag_facets f{clause}", params
+            ).fetchone()[0]
     with connect() as conn:
+        joins, clause, params = _build_filters(
+            conn, q, category, source, include_deprecated, min_sources=min_sources,
+            max_hits=_FTS_COUNT_HITS,
+        )
+        sql = f"SELECT COUNT(*) FROM tags t{joins}{clause}"
         c = conn.cursor()
         c.execute(sql, params)
         return c.fetchone()[0]
 
 
-def category_counts(source=None, include_deprecated=False):
-    joins, clause, params = _build_filters(None, None, source, include_deprecated)
-    sql = f"""
-        SELECT t.category, COUNT(*)
-        FROM tags t{joins}{clause}
-        GROUP BY t.category
-        ORDER BY COUNT(*) DESC
-    """
+@_cached_result
+def category_counts(source=None, include_deprecated=False, min_sources=None):
+    if not (min_sources and min_sources > 1):
+        clause, params = _facet_filters(None, source, include_deprecated)
+        with connect() as conn:
+            c = conn.execute(
+                f"""
+                SELECT f.category, SUM(f.n) FROM tag_facets f{clause}
+                GROUP BY f.category
+                ORDER BY SUM(f.n) DESC, f.category
+                """,
+                params,
+            )
+            return [{"category": row[0], "count": row[1]} for row in c.fetchall()]
     with connect() as conn:
+        joins, clause, params = _build_filters(
+            conn, None, None, source, include_deprecated, min_sources=min_sources
+        )
+        sql = f"""
+            SELECT t.category, COUNT(*)
+            FROM tags t{joins}{clause}
+            GROUP BY t.category
+            ORDER BY COUNT(*) DESC
+        """
         c = conn.cursor()
         c.execute(sql, params)
         return [{"category": row[0], "count": row[1]} for row in c.fetchall()]
 
 
+def complete_tags(prefix, limit=20):
+    """Most popular non-deprecated tags whose name starts with `prefix` (ASCII case-insensitive,
+    spaces read as underscores), by post_count and then name. Short prefixes are one
+    tag_prefix_topk row; longer ones come from the published generation's mapped prefix index."""
+    prefix = prefix.strip().replace(" ", "_")
+    path = get_tags_db_path()
+    if not prefix or path is None:
+        return []
+    if len(prefix) <= _PREFIX_TOPK_LEN and limit <= _PREFIX_TOPK:
+        with connect() as conn:
+            row = conn.execute(
+                "SELECT tags FROM tag_prefix_topk WHERE prefix = ?", (_prefix_key(prefix),)
+            ).fetchone()
+        tags = json.loads(row[0]) if row else []
+        return _by_popularity(
+            {"name": n, "post_count": pc, "category": cat} for n, pc, cat in tags[:limit]
+        )
+    index = tag_index.load(_index_path(path))
+    if index is not None:
+        # The index breaks ties in its NOCASE order; the page itself is sorted like the SQL.
+        return _by_popularity(tag_index.prefix_search(index, prefix, limit))
+    # A generation built before the index existed: the same answer, the slow way.
+    with connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT name, post_count, category FROM tags
+            WHERE name LIKE ? ESCAPE '\\' AND is_deprecated = 0
+            ORDER BY post_count DESC, name LIMIT ?
+            """,
+            (_like_literal(prefix) + "%", limit),
+        ).fetchall()
+    return [{"name": r[0], "post_count": r[1], "category": r[2]} for r in rows]
+
+
+def _by_popularity(tags):
+    return sorted(tags, key=lambda t: (-t["post_count"], t["name"]))
+
+
+@_cached_result
 def list_sources():
     """Distinct sources present in the cache with their tag counts."""
     with connect() as conn:
         c = conn.cursor()
         try:
             c.execute(
-                "SELECT source, COUNT(*) FROM tag_sources GROUP BY source ORDER BY source"
+                "SELECT source, SUM(n) FROM tag_facets WHERE source != '' "
+                "GROUP BY source ORDER BY source"
             )
         except sqlite3.OperationalError:
             return []
@@ -623,16 +1870,25 @@ def list_sources():
 
 
 def get_tag_detail(name):
-    """Full metadata (parsed original record) + all sources for a single tag."""
+    """Full metadata (parsed original record of the winning source) + all sources for a tag."""
     with connect() as conn:
         c = conn.cursor()
-        c.execute("SELECT name, metadata FROM tags WHERE name = ?", (name,))
+        c.execute(
+            """
+            SELECT t.name, m.data, s.meta_slot
+            FROM tags t
+            JOIN tag_sources s ON s.name = t.name AND s.source = t.primary_source
+            LEFT JOIN tag_metadata m ON m.block = s.meta_block
+            WHERE t.name = ?
+            """,
+            (name,),
+        )
         row = c.fetchone()
         if not row:
             return None
         try:
-            metadata = json.loads(row[1]) if row[1] else {}
-        except (ValueError, TypeError):
+            metadata = _unpack_metadata(row[1], row[2]) if row[1] else {}
+        except (zlib.error, IndexError, ValueError, TypeError, AttributeError):
             metadata = {}
         c.execute(
             "SELECT source FROM tag_sources WHERE name = ? ORDER BY source", (row[0],)
@@ -641,14 +1897,185 @@ def get_tag_detail(name):
         return {"name": row[0], "metadata": metadata, "sources": sources}
 
 
+def resolve_tags(names):
+    """Look up many tag names at once, in input order.
+
+    Each result is {input, found, name, category, post_count, is_deprecated}; `name` is the
+    dataset's casing. Names match case-insensitively, and a prompt-style "long hair" falls back
+    to "long_hair". One json_each join against the unique name index serves the whole batch.
+    """
+    names = [n.strip() if isinstance(n, str) else "" for n in names]
+    with connect() as conn:
+        # t.name stays on the left of each comparison so its NOCASE collation applies.
+        rows = conn.execute(
+            """
+            SELECT j.key, COALESCE(t.name, u.name), COALESCE(t.category, u.category),
+                   COALESCE(t.post_count, u.post_count), COALESCE(t.is_deprecated, u.is_deprecated)
+            FROM json_each(?) j
+            LEFT JOIN tags t ON t.name = j.value
+            LEFT JOIN tags u ON t.id IS NULL AND u.name = replace(j.value, ' ', '_')
+            ORDER BY j.key
+            """,
+            (json.dumps(names),),
+        ).fetchall()
+    return [
+        {
+            "input": names[key],
+            "found": name is not None,
+            "name": name,
+            "category": category,
+            "post_count": post_count,
+            "is_deprecated": is_deprecated,
+        }
+        for key, name, category, post_count, is_deprecated in rows
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Fuzzy lookup
+# ---------------------------------------------------------------------------
+
+# Characters tried for substitutions/insertions in one-edit variants (plus the query's own).
+_FUZZY_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789_-()'.:!?&+/"
+_FUZZY_MAX_QUERY = 64
+# Distance 2 needs a query that splits into 3 pieces the trigram index can look up.
+_FUZZY_PIECES = 3
+# Most popular names fetched per piece before verification.
+_FUZZY_PIECE_CANDIDATES = 1000
+
+
+def _edits1(word, alphabet):
+    """Every string one delete, transposition, substitution or insertion away from `word`."""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    edits = {a + b[1:] for a, b in splits if b}
+    edits.update(a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1)
+    edits.update(a + ch + b[1:] for a, b in splits if b for ch in alphabet)
+    edits.update(a + ch + b for a, b in splits for ch in alphabet)
+    return edits
+
+
+def _osa_distance(a, b, limit):
+    """Optimal string alignment distance (adjacent transpositions count 1), capped at limit+1."""
+    while a and b and a[0] == b[0]:
+        a, b = a[1:], b[1:]
+    while a and b and a[-1] == b[-1]:
+        a, b = a[:-1], b[:-1]
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        row = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            d = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                d = min(d, before[j - 2] + 1)
+            row[j] = d
+        if min(row) > limit:
+            return limit + 1
+        before, prev = prev, row
+    return min(prev[-1], limit + 1)
+
+
+def fuzzy_tags(q, limit=10, max_distance=2, include_deprecated=False):
+    """Tags within `max_distance` edits of `q`, closest first, then by post_count.
+
+    Distance 1 is exhaustive: every one-edit variant of `q` is looked up by name. Distance 2
+    is searched for queries of 9+ characters: two edits leave at least one of three pieces
+    of `q` intact, so the pieces are found through the trigram index near their original
+    position. That part is best effort: pieces common enough to need a scan are skipped, and
+    a piece is only checked at its first occurrence in a name.
+    """
+    word = q.strip().lower()[:_FUZZY_MAX_QUERY]
+    if not word:
+        return []
+    max_distance = max(0, min(max_distance, 2))
+    deprecated = "" if include_deprecated else " AND t.is_deprecated = 0"
+    columns = "SELECT t.name, t.post_count, t.category, t.is_deprecated FROM tags t"
+
+    with connect() as conn:
+        c = conn.cursor()
+        variants = {word}
+        if max_distance:
+            variants |= _edits1(word, set(_FUZZY_ALPHABET) | set(word))
+        c.execute(
+            f"{columns} WHERE t.name IN (SELECT value FROM json_each(?)){deprecated}",
+            (json.dumps(sorted(variants)),),
+        )
+        candidates = {row[0]: row for row in c.fetchall()}
+
+        size = len(word) // _FUZZY_PIECES
+        if _HAS_FTS and max_distance == 2 and size >= _FTS_MIN_QUERY:
+            for k in range(_FUZZY_PIECES):
+                start = k * size
+                piece = word[start:] if k == _FUZZY_PIECES - 1 else word[start:start + size]
+                if _fts_hits(conn, _fts_phrase(piece), _FTS_PAGE_HITS) >= _FTS_PAGE_HITS:
+                    continue
+                c.execute(
+                    f"""{columns}
+                    WHERE t.id IN (SELECT rowid FROM tags_fts WHERE tags_fts MATCH ?)
+                      AND length(t.name) BETWEEN ? AND ?
+                      AND instr(lower(t.name), ?) BETWEEN ? AND ?{deprecated}
+                    ORDER BY t.post_count DESC
+                    LIMIT ?""",
+                    (_fts_phrase(piece), len(word) - 2, len(word) + 2,
+                     piece, start - 1, start + 3, _FUZZY_PIECE_CANDIDATES),
+                )
+                for row in c.fetchall():
+                    candidates.setdefault(row[0], row)
+
+    results = []
+    for name, post_count, category, is_deprecated in candidates.values():
+        distance = _osa_distance(word, name.lower(), max_distance)
+        if distance <= max_distance:
+            results.append({
+                "name": name,
+                "post_count": post_count,
+                "category": category,
+                "is_deprecated": is_deprecated,
+                "distance": distance,
+            })
+    results.sort(key=lambda r: (r["distance"], -(r["post_count"] or 0), r["name"]))
+    return results[:limit]
+
+
 # ---------------------------------------------------------------------------
 # Preset dataset download
 # ---------------------------------------------------------------------------
 
 _DOWNLOAD_CHUNK = 1 << 20  # 1 MiB
+# Attempts per file before a network error is raised. Waits between attempts double from
+# _DOWNLOAD_BACKOFF seconds up to _DOWNLOAD_BACKOFF_MAX (or follow the server's Retry-After).
+_DOWNLOAD_ATTEMPTS = 6
+_DOWNLOAD_BACKOFF = 1.0
+_DOWNLOAD_BACKOFF_MAX = 30.0
+# HTTP statuses worth retrying; other errors (404 above all) are answers callers act on.
+_DOWNLOAD_RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+# Sidecar of a .part file recording the validators it was started with, so a resumed
+# transfer can't splice two versions of a file together. (Not a tag file extension.)
+_PART_STATE_SUFFIX = ".part.state"
+_SHA256_RE = re.compile(r"[0-9a-f]{64}")
+# Sent with every download request. Byte counts, ranges and checksums all refer to the file as
+# stored; requests would transparently decode a gzip-encoded response, so ask for none.
+_IDENTITY_ENCODING = {"Accept-Encoding": "identity"}
+# Files of at least two _SEGMENT_MIN_SIZE segments are fetched as up to _DOWNLOAD_SEGMENTS
+# concurrent byte ranges when the server accepts ranges: one connection is capped by the CDN's
+# per-connection throughput. Segment progress is saved every _SEGMENT_SAVE_BYTES for resuming.
+_DOWNLOAD_SEGMENTS = 4
+_SEGMENT_MIN_SIZE = 64 << 20
+_SEGMENT_SAVE_BYTES = 32 << 20
+# Per-source downloads of a multi_source preset run in parallel, this many at a time unless
+# the preset sets "concurrency".
+_DOWNLOAD_WORKERS = 4
 # Local tag files a re-download must clear so a new format can't be shadowed by an old one.
 _STALE_TAG_FILES = ("tags.jsonl", "tags.json", "tags.csv", "tags.sqlite", "tags.db")
-# Hugging Face datasets API (used to enumerate a multi-source repo's directories).
+# Preset formats imported while they download (see _StreamedImport): read front to back,
+# any prefix of the file is a valid run of records. A reader that has caught up with the
+# download looks again after _STREAM_POLL seconds at the latest.
+_STREAM_IMPORT_FORMATS = ("jsonl", "csv")
+_STREAM_POLL = 0.1
+# Hugging Face dataset files (<repo>/resolve/main/<path>) and the datasets API (used to
+# enumerate a multi-source repo's directories).
+_HF_DATASETS = "https://huggingface.co/datasets"
 _HF_DATASETS_API = "https://huggingface.co/api/datasets"
 
 
@@ -658,43 +2085,496 @@ def _write_manifest(directory, manifest):
         json.dump(manifest, f)
 
 
-def _download_file(file_url, dest, progress_cb=None):
-    """Stream a URL to dest atomically via a .part temp file. Raises requests exceptions.
+def _read_part_state(dest):
+    try:
+        with open(dest + _PART_STATE_SUFFIX, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
 
-    progress_cb(downloaded_bytes, total_bytes) is called as bytes arrive (total 0 if unknown).
+def _write_part_state(dest, state):
+    with open(dest + _PART_STATE_SUFFIX, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+def _discard_part(dest):
+    for path in (dest + ".part", dest + _PART_STATE_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _linked_sha256(response):
+    """SHA-256 Hugging Face publishes for an LFS file (X-Linked-Etag on the resolve response,
+    before the CDN redirect), or None for files kept in git."""
+    for r in (*response.history, response):
+        etag = r.headers.get("X-Linked-Etag", "").removeprefix("W/").strip('"')
+        if _SHA256_RE.fullmatch(etag):
+            return etag
+    return None
+
+
+def _validators(file_url, response):
+    """Part-state fields identifying the version of the file `response` starts sending."""
+    etag = response.headers.get("ETag")
+    return {
+        "url": file_url,
+        "etag": etag if etag and not etag.startswith("W/") else None,
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": _linked_sha256(response),
+    }
+
+
+def _content_range(response):
+    """(first byte, full size) of a 206 response; size 0 if the server doesn't say."""
+    match = re.fullmatch(r"bytes (\d+)-\d+/(\d+|\*)", response.headers.get("Content-Range", ""))
+    if not match:
+        return None, 0
+    return int(match.group(1)), int(match.group(2)) if match.group(2) != "*" else 0
+
+
+def _sha256_file(path, hasher=None):
+    hasher = hasher or hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_DOWNLOAD_CHUNK), b""):
+            hasher.update(chunk)
+    return hasher
+
+
+def _fetch_part(file_url, dest, progress_cb=None):
+    """One attempt at completing dest + '.part'. Returns (state, sha256 hasher of the file).
+
+    Continues an existing partial file with a Range request when its recorded state matches;
+    If-Range makes the server send the whole (changed) file instead of the rest of it.
     """
     tmp = dest + ".part"
-    try:
-        with requests.get(file_url, stream=True, timeout=60) as r:
-            r.raise_for_status()
+    state = _read_part_state(dest)
+    offset = os.path.getsize(tmp) if state.get("url") == file_url and os.path.exists(tmp) else 0
+    headers = dict(_IDENTITY_ENCODING)
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        validator = state.get("etag") or state.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    with requests.get(file_url, stream=True, timeout=60, headers=headers) as r:
+        if r.status_code == 416 and offset and offset == state.get("size"):
+            return state, _sha256_file(tmp)  # the previous attempt got every byte
+        r.raise_for_status()
+        if offset and r.status_code == 206:
+            start, total = _content_range(r)
+            if start != offset or (state.get("size") and total != state["size"]):
+                _discard_part(dest)
+                raise requests.ConnectionError("Server answered the resume with another range")
+            hasher = _sha256_file(tmp)
+            mode = "ab"
+        else:
             total = int(r.headers.get("Content-Length") or 0)
-            downloaded = 0
-            if progress_cb:
-                progress_cb(downloaded, total)
-            with open(tmp, "wb") as f:
+            state = {**_validators(file_url, r), "size": total}
+            _write_part_state(dest, state)
+            offset = 0
+            hasher = hashlib.sha256()
+            mode = "wb"
+
+        downloaded = offset
+        if progress_cb:
+            progress_cb(downloaded, total)
+        with open(tmp, mode) as f:
+            for chunk in r.iter_content(chunk_size=_DOWNLOAD_CHUNK):
+                if chunk:
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    downloaded += len(chunk)
+                    if progress_cb:
+                        progress_cb(downloaded, total)
+    if total and downloaded != total:
+        raise requests.ConnectionError(f"Connection closed after {downloaded} of {total} bytes")
+    return state, hasher
+
+
+class _RangeMismatch(requests.ConnectionError):
+    """A segment request was answered with something other than its range (the file changed)."""
+
+
+def _segmented_state(file_url, dest, segments):
+    """Part state for downloading file_url in byte-range segments, or None to stream it whole.
+
+    A partial download is continued the way it was started. Otherwise a HEAD request decides:
+    a big enough file from a server that accepts ranges gets a preallocated .part file and
+    up to `segments` [start, end, written] ranges.
+    """
+    state = _read_part_state(dest)
+    if state.get("url") == file_url and os.path.exists(dest + ".part"):
+        return state if state.get("segments") else None
+    if segments < 2:
+        return None
+    r = requests.head(file_url, allow_redirects=True, timeout=60, headers=_IDENTITY_ENCODING)
+    r.raise_for_status()
+    size = int(r.headers.get("Content-Length") or 0)
+    count = min(segments, size // _SEGMENT_MIN_SIZE)
+    if r.headers.get("Accept-Ranges", "").lower() != "bytes" or count < 2:
+        return None
+    step = -(-size // count)
+    state = {
+        **_validators(file_url, r),
+        "size": size,
+        "segments": [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)],
+    }
+    with open(dest + ".part", "wb") as f:
+        f.truncate(size)
+    _write_part_state(dest, state)
+    return state
+
+
+def _fetch_segments(file_url, dest, state, progress_cb=None):
+    """One attempt at the unfinished segments of `state`, fetched concurrently and written in
+    place into the .part file. Raises the first failure once every segment has stopped."""
+    tmp = dest + ".part"
+    size = state["size"]
+    segments = state["segments"]
+    validator = state.get("etag") or state.get("last_modified")
+    lock = threading.Lock()
+    saved = [sum(segment[2] for segment in segments)]
+
+    def report():
+        downloaded = sum(segment[2] for segment in segments)
+        if downloaded - saved[0] >= _SEGMENT_SAVE_BYTES:
+            _write_part_state(dest, state)
+            saved[0] = downloaded
+        if progress_cb:
+            progress_cb(downloaded, size)
+
+    def fetch(segment):
+        start, end, written = segment
+        if start + written > end:
+            return
+        headers = {**_IDENTITY_ENCODING, "Range": f"bytes={start + written}-{end}"}
+        if validator:
+            headers["If-Range"] = validator
+        with requests.get(file_url, stream=True, timeout=60, headers=headers) as r:
+            r.raise_for_status()
+            if r.status_code != 206 or _content_range(r) != (start + written, size):
+                raise _RangeMismatch("Server answered a segment request with another range")
+            with open(tmp, "r+b") as f:
+                f.seek(start + written)
                 for chunk in r.iter_content(chunk_size=_DOWNLOAD_CHUNK):
+                    chunk = chunk[:end + 1 - start - segment[2]]
                     if chunk:
                         f.write(chunk)
-                        downloaded += len(chunk)
-                        if progress_cb:
-                            progress_cb(downloaded, total)
-        os.replace(tmp, dest)
-    finally:
-        if os.path.exists(tmp):
-            os.remove(tmp)
+                        with lock:
+                            segment[2] += len(chunk)
+                            report()
+                    if start + segment[2] > end:
+                        break  # a server may send past the range's end
+        if start + segment[2] <= end:
+            raise requests.ConnectionError(
+                f"Connection closed {end + 1 - start - segment[2]} bytes before a segment's end"
+            )
+
+    with lock:
+        report()
+    with ThreadPoolExecutor(max_workers=len(segments), thread_name_prefix="spl-segment") as pool:
+        futures = [pool.submit(fetch, segment) for segment in segments]
+    errors = [future.exception() for future in futures if future.exception()]
+    _write_part_state(dest, state)
+    if errors:
+        if any(isinstance(e, _RangeMismatch) for e in errors):
+            _discard_part(dest)
+        raise errors[0]
+
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before retrying after `error`, or None if it isn't worth retrying."""
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        if response is None or response.status_code not in _DOWNLOAD_RETRY_STATUSES:
+            return None
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), _DOWNLOAD_BACKOFF_MAX)
+    elif not isinstance(error, (requests.ConnectionError, requests.Timeout,
+                                requests.exceptions.ChunkedEncodingError)):
+        return None
+    return min(_DOWNLOAD_BACKOFF * 2 ** attempt, _DOWNLOAD_BACKOFF_MAX)
 
 
-def download_preset(preset, progress=None):
+def _install_part(dest):
+    """Move a finished dest + '.part' into place and drop its state sidecar."""
+    os.replace(dest + ".part", dest)
+    os.remove(dest + _PART_STATE_SUFFIX)
+
+
+def _download_file(file_url, dest, progress_cb=None, segments=1, keep_part=False):
+    """Download a URL to dest atomically via a resumable .part file. Raises requests exceptions.
+
+    Dropped connections and transient server errors are retried with exponential backoff,
+    each attempt resuming where the .part file stops (it is kept across failed downloads
+    too). With `segments` > 1 a large file is fetched as that many concurrent byte ranges
+    (see _segmented_state). A file Hugging Face stores in LFS is checked against its
+    published SHA-256 before it replaces dest; on a mismatch the partial data is discarded
+    and ValueError raised.
+
+    progress_cb(downloaded_bytes, total_bytes) is called as bytes arrive (total 0 if unknown).
+    With keep_part the verified file stays at dest + '.part' for the caller to _install_part.
+    Returns the validators of the downloaded version ({url, etag, last_modified, sha256,
+    size}) for a manifest's "upstream" entry (see _current_download).
+    """
+    for attempt in range(_DOWNLOAD_ATTEMPTS):
+        try:
+            state = _segmented_state(file_url, dest, segments)
+            if state:
+                _fetch_segments(file_url, dest, state, progress_cb=progress_cb)
+                hasher = None
+            else:
+                state, hasher = _fetch_part(file_url, dest, progress_cb=progress_cb)
+            break
+        except requests.RequestException as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None or attempt + 1 == _DOWNLOAD_ATTEMPTS:
+                raise
+            time.sleep(delay)
+
+    expected = state.get("sha256")
+    if expected:
+        # Segments arrive out of order, so they are hashed in one pass at the end.
+        digest = (hasher or _sha256_file(dest + ".part")).hexdigest()
+        if digest != expected:
+            _discard_part(dest)
+            raise ValueError(
+                f"Checksum mismatch for {os.path.basename(dest)} "
+                f"(expected sha256 {expected}, got {digest})"
+            )
+    if not keep_part:
+        _install_part(dest)
+    return {key: state.get(key) for key in ("url", "etag", "last_modified", "sha256", "size")}
+
+
+def _current_download(directory, urls):
+    """The manifest of the earlier download in `directory` if its file is still what upstream
+    serves, else None. Costs one conditional HEAD request.
+
+    `urls` are the files the preset would download now; a manifest without recorded
+    validators ("upstream") or for another file never counts as current.
+    """
+    manifest, _ = _read_manifest(directory)
+    upstream = manifest.get("upstream") or {}
+    if upstream.get("url") not in urls:
+        return None
+    if not os.path.exists(os.path.join(directory, f"tags.{manifest.get('format')}")):
+        return None
+    headers = dict(_IDENTITY_ENCODING)
+    if upstream.get("etag"):
+        headers["If-None-Match"] = upstream["etag"]
+    if upstream.get("last_modified"):
+        headers["If-Modified-Since"] = upstream["last_modified"]
+    try:
+        r = requests.head(upstream["url"], allow_redirects=True, timeout=60, headers=headers)
+    except requests.RequestException:
+        return None  # can't tell; the download itself reports the network problem
+    if r.status_code == 304:
+        return manifest
+    if not r.ok:
+        return None
+    current = _validators(upstream["url"], r)
+    if current["sha256"] and upstream.get("sha256"):
+        return manifest if current["sha256"] == upstream["sha256"] else None
+    return manifest if current["etag"] and current["etag"] == upstream.get("etag") else None
+
+
+class _StreamAborted(Exception):
+    """The download a streamed import was reading failed or had to start over."""
+
+
+class _GrowingFile(io.RawIOBase):
+    """Reads a file that a download is still appending to, as if it were complete.
+
+    A read at the current end waits for more bytes; only the end of the finished, verified
+    download is EOF. Closing the file after that EOF installs the download (see
+    _StreamedImport.open).
+    """
+
+    def __init__(self, stream):
+        super().__init__()
+        self._stream = stream
+        self._f = open(stream.path, "rb", buffering=0)
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._f.seek(offset, whence)
+
+    def tell(self):
+        return self._f.tell()
+
+    def readinto(self, b):
+        while True:
+            # Checked before reading: once the download is finished, an empty read is the end.
+            finished = self._stream.check()
+            n = self._f.readinto(b)
+            if n or finished:
+                self._eof = not n
+                return n
+            self._stream.wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self._f.close()  # before installing: Windows can't rename a file that is open
+        super().close()
+        if self._eof:
+            self._stream.install()
+
+
+class _StreamedImport:
+    """Imports a preset's tag file into the cache while it downloads.
+
+    The first bytes start a cache rebuild on its own thread, with the file's source reading
+    dest + '.part' through _GrowingFile. The download thread reports bytes with notify() and
+    ends with finish() or abort(). The reader only sees EOF after finish(), i.e. once the file
+    is complete and verified; it then calls `install` (move the file into place, write the
+    manifest) on the rebuild thread, before the generation's source signatures are taken, so
+    those describe the finished file.
+    """
+
+    def __init__(self, source, install, progress_cb=None):
+        self.dest = source["abspath"]
+        self.path = self.dest + ".part"
+        self.source = dict(source, abspath=self.path, mtime=0, size=0, manifest_mtime=0, follow=self)
+        self.installed = False
+        self._install = install
+        self._progress_cb = progress_cb
+        self._cond = threading.Condition()
+        self._finished = False
+        self._error = None
+        self._seen = 0
+        self._thread = None
+        self._started = False
+        self._failed = None
+
+    def notify(self, downloaded):
+        """Report the bytes written so far; the first ones start the rebuild."""
+        with self._cond:
+            if downloaded < self._seen and self._error is None:
+                # A retry refused to resume and rewrites the file: what was read is void.
+                self._error = _StreamAborted("The download restarted")
+            self._seen = downloaded
+            self._cond.notify_all()
+        if downloaded and not self._started:
+            self._started = True
+            self._start()
+
+    def _start(self):
+        # Only one rebuild at a time; if one is running, the caller imports afterwards.
+        if not _rebuild_lock.acquire(blocking=False):
+            return
+        stale = {self.source["source"].rsplit("/", 1)[0] + "/" + name for name in _STALE_TAG_FILES}
+        sources = [s for s in discover_sources() if s["source"] not in stale] + [self.source]
+        sources.sort(key=lambda s: s["source"])
+
+        def run():
+            try:
+                _rebuild(sources, progress_cb=self._progress_cb)
+            except BaseException as e:  # the download thread falls back to a regular import
+                self._failed = e
+            finally:
+                _rebuild_lock.release()
+
+        self._thread = threading.Thread(target=run, name="spl-streamed-import", daemon=True)
+        self._thread.start()
+
+    def finish(self):
+        """The file is complete and verified. Waits for the rebuild; True if it published it."""
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+        if self._thread is None:
+            return False
+        self._thread.join()
+        return self._failed is None and self.installed
+
+    def abort(self, error):
+        """The download failed: stop (and wait for) the rebuild, leaving the live cache as is."""
+        with self._cond:
+            if self._error is None:
+                self._error = _StreamAborted(str(error))
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def check(self):
+        """Raise if the download failed, else return whether it has finished."""
+        with self._cond:
+            if self._error is not None:
+                raise self._error
+            return self._finished
+
+    def wait(self):
+        with self._cond:
+            self._cond.wait(_STREAM_POLL)
+
+    def install(self):
+        """Install the download (once) and point the source at the final file."""
+        if self.installed:
+            return
+        self._install()
+        self.installed = True
+        stat = os.stat(self.dest)
+        _, manifest_mtime = _read_manifest(os.path.dirname(self.dest))
+        self.source.update(
+            abspath=self.dest, mtime=stat.st_mtime, size=stat.st_size, manifest_mtime=manifest_mtime
+        )
+
+    def open(self, path, mode="r", **kwargs):
+        """open() for the source's readers (see _iter_records); `path` is the .part file."""
+        f = io.BufferedReader(_GrowingFile(self))
+        return f if "b" in mode else io.TextIOWrapper(f, **kwargs)
+
+
+def _install_download(dest, fmt, upstream, preset):
+    """Put a preset's verified download (kept as dest + '.part') in place with its manifest."""
+    dest_dir = os.path.dirname(dest)
+    _install_part(dest)
+    # Replace semantics: drop any other tag format left from an earlier download (only now,
+    # so a failed download leaves the previous file in place).
+    for stale in _STALE_TAG_FILES:
+        stale_path = os.path.join(dest_dir, stale)
+        if stale_path != dest and os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    # Persist how this dataset was produced and how to interpret it.
+    _write_manifest(dest_dir, {
+        "preset_id": preset["id"],
+        "format": fmt,
+        "remote": os.path.basename(dest),
+        "mapping": preset.get("mapping"),
+        "sqlite_query": preset.get("sqlite_query"),
+        "downloaded_at": time.time(),
+        "upstream": upstream,
+    })
+
+
+def download_preset(preset, progress=None, refresh_cache=True):
     """Download a preset's tag file into datasets/<local_dir>/tags.<fmt> and refresh the cache.
 
-    Tries preset['files'] in order, using the first that resolves. Returns
-    {id, name, source, format}. Raises ValueError for bad config / no available file and
-    requests.RequestException for network failures.
+    Tries preset['files'] in order, using the first that resolves. A file downloaded before
+    is first checked against upstream (see _current_download): if it is unchanged, neither
+    the file nor the cache is touched. Returns {id, name, source, format, updated}. Raises
+    ValueError for bad config / no available file and requests.RequestException for network
+    failures.
+
+    JSONL and CSV files are imported into the cache while they download (see _StreamedImport);
+    other formats, or a streamed import that can't run or fails, are imported afterwards.
 
     If `progress` is a dict, it is updated live with phase/downloaded/total/imported.
+    With refresh_cache=False the caller rebuilds the cache itself (see refresh_presets).
     """
     if preset.get("kind") == "multi_source":
-        return _download_multi_source(preset, progress=progress)
+        return _download_multi_source(preset, progress=progress, refresh_cache=refresh_cache)
 
     def upd(**kw):
         if progress is not None:
@@ -707,51 +2587,93 @@ def download_preset(preset, progress=None):
         raise ValueError("Invalid preset local_dir")
     os.makedirs(dest_dir, exist_ok=True)
 
-    # Replace semantics: drop any prior tag file before writing the fresh one.
-    for stale in _STALE_TAG_FILES:
-        stale_path = os.path.join(dest_dir, stale)
-        if os.path.exists(stale_path):
-            os.remove(stale_path)
-
-    upd(phase="downloading", downloaded=0, total=0)
-    chosen = None
-    last_status = None
-    for candidate in preset.get("files", []):
-        remote, fmt = candidate["remote"], candidate["format"]
-        file_url = f"https://huggingface.co/datasets/{repo}/resolve/main/{remote}"
-        dest = os.path.join(dest_dir, f"tags.{fmt}")
-        try:
-            _download_file(
-                file_url, dest,
-                progress_cb=lambda d, tot: upd(downloaded=d, total=tot),
-            )
-            chosen = (dest, fmt)
-            break
-        except requests.HTTPError as e:
-            last_status = e.response.status_code if e.response is not None else None
-            if last_status in (401, 403, 404):
-                continue  # try the next candidate file
-            raise
-
-    if not chosen:
-        detail = f" (last status {last_status})" if last_status else ""
-        raise ValueError(f"None of the expected files were found in '{repo}'{detail}")
-
-    dest, fmt = chosen
-
-    # Persist how this dataset was produced and how to interpret it.
-    _write_manifest(dest_dir, {
+    # How to interpret the dataset; a change here alone only rewrites the manifest.
+    interpretation = {
         "preset_id": preset["id"],
-        "format": fmt,
-        "remote": os.path.basename(dest),
         "mapping": preset.get("mapping"),
         "sqlite_query": preset.get("sqlite_query"),
-        "downloaded_at": time.time(),
-    })
+    }
+    candidates = [
+        (f"{_HF_DATASETS}/{repo}/resolve/main/{c['remote']}", c["format"])
+        for c in preset.get("files", [])
+    ]
+
+    upd(phase="checking", downloaded=0, total=0)
+    streamed = False
+    current = _current_download(dest_dir, [file_url for file_url, _ in candidates])
+    if current is not None:
+        fmt = current["format"]
+        dest = os.path.join(dest_dir, f"tags.{fmt}")
+        updated = any(current.get(key) != value for key, value in interpretation.items())
+        if updated:
+            _write_manifest(dest_dir, {**current, **interpretation})
+    else:
+        upd(phase="downloading", downloaded=0, total=0, imported=0)
+        chosen = stream = None
+        last_status = None
+        for file_url, fmt in candidates:
+            dest = os.path.join(dest_dir, f"tags.{fmt}")
+            stream = None
+            if refresh_cache and fmt in _STREAM_IMPORT_FORMATS:
+                # Import while downloading, so the wait is the slower of the two, not their sum.
+                rel_dir = os.path.relpath(dest_dir, datasets_dir).replace(os.sep, "/")
+                stream = _StreamedImport(
+                    {
+                        "source": os.path.relpath(dest, datasets_dir).replace(os.sep, "/"),
+                        "abspath": dest,
+                        "format": fmt,
+                        "mapping": preset.get("mapping"),
+                        "sqlite_query": preset.get("sqlite_query"),
+                        "transform": site_tags.adapter_for_dir(rel_dir),
+                    },
+                    lambda: _install_download(*chosen, preset),
+                    progress_cb=lambda n: upd(imported=n),
+                )
+
+            def on_progress(downloaded, total, stream=stream):
+                upd(downloaded=downloaded, total=total)
+                if stream is not None:
+                    stream.notify(downloaded)
+
+            try:
+                upstream = _download_file(
+                    file_url, dest,
+                    progress_cb=on_progress,
+                    # Segments arrive out of order; a streamed import needs the file in order.
+                    segments=1 if stream else preset.get("segments") or _DOWNLOAD_SEGMENTS,
+                    keep_part=True,
+                )
+                chosen = (dest, fmt, upstream)
+                break
+            except BaseException as e:
+                if stream is not None:
+                    stream.abort(e)
+                if not isinstance(e, requests.HTTPError):
+                    raise
+                last_status = e.response.status_code if e.response is not None else None
+                if last_status in (401, 403, 404):
+                    continue  # try the next candidate file
+                raise
 
-    # Rebuild the cache so the new dataset is immediately searchable.
-    upd(phase="importing", imported=0)
-    ensure_cache(progress_cb=lambda n: upd(imported=n))
+        if not chosen:
+            detail = f" (last status {last_status})" if last_status else ""
+            raise ValueError(f"None of the expected files were found in '{repo}'{detail}")
+
+        dest, fmt, upstream = chosen
+        if stream is not None:
+            upd(phase="importing")
+            streamed = stream.finish()
+        if stream is None or not stream.installed:
+            _install_download(dest, fmt, upstream, preset)
+        updated = True
+
+    # Rebuild the cache so the new dataset is immediately searchable (unless the streamed
+    # import already published it).
+    if updated and refresh_cache:
+        invalidate_sources()
+        if not streamed:
+            upd(phase="importing", imported=0)
+            ensure_cache(progress_cb=lambda n: upd(imported=n))
 
     source_rel = os.path.relpath(dest, datasets_dir).replace(os.sep, "/")
     return {
@@ -759,6 +2681,7 @@ def download_preset(preset, progress=None):
         "name": preset.get("name", preset["id"]),
         "source": source_rel,
         "format": fmt,
+        "updated": updated,
     }
 
 
@@ -772,12 +2695,83 @@ def _hf_list_dirs(repo):
     return sorted(dirs)
 
 
-def _download_multi_source(preset, progress=None):
+class _DownloadCancelled(Exception):
+    """Raised from a progress callback to abandon a download (its .part file is kept)."""
+
+
+def _download_source(preset, sub, dest_root, progress_cb=None):
+    """Download one multi-source directory's first matching candidate file.
+
+    Returns (source name, whether anything changed on disk), or None if the directory has
+    none of the candidate files. An earlier download that is still current is kept as is.
+    """
+    repo = preset["repo"]
+    source_name = sub.split("/")[-1]
+    dest_dir = os.path.abspath(os.path.join(dest_root, source_name))
+    if os.path.commonpath([dest_root, dest_dir]) != dest_root:
+        return None  # guard against traversal via an unexpected directory name
+
+    base_url = f"{_HF_DATASETS}/{repo}/resolve/main/{sub}"
+    current = _current_download(
+        dest_dir, [f"{base_url}/{c['remote']}" for c in preset.get("files", [])]
+    )
+    if current is not None:
+        interpretation = {"preset_id": preset["id"], "mapping": preset.get("mapping")}
+        if all(current.get(key) == value for key, value in interpretation.items()):
+            return source_name, False
+        _write_manifest(dest_dir, {**current, **interpretation})
+        return source_name, True
+
+    chosen = None
+    for candidate in preset.get("files", []):
+        remote, fmt = candidate["remote"], candidate["format"]
+        file_url = f"{base_url}/{remote}"
+        os.makedirs(dest_dir, exist_ok=True)
+        dest = os.path.join(dest_dir, f"tags.{fmt}")
+        try:
+            upstream = _download_file(file_url, dest, progress_cb=progress_cb)
+            chosen = (dest, fmt, remote, upstream)
+            break
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status in (401, 403, 404):
+                continue  # this source lacks that format; try the next candidate
+            raise
+
+    if not chosen:
+        return None
+
+    dest, fmt, remote, upstream = chosen
+    # Replace semantics: drop any other tag format left in this source dir.
+    for stale in _STALE_TAG_FILES:
+        stale_path = os.path.join(dest_dir, stale)
+        if stale_path != dest and os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    _write_manifest(dest_dir, {
+        "preset_id": preset["id"],
+        "format": fmt,
+        "remote": remote,
+        "mapping": preset.get("mapping"),
+        "downloaded_at": time.time(),
+        "upstream": upstream,
+    })
+    return source_name, True
+
+
+def _download_multi_source(preset, progress=None, refresh_cache=True):
     """Download every <source>/tags.<fmt> in a multi-source repo as-is (no import yet).
 
-    Enumerates the repo's top-level directories and, for each, downloads the first
-    matching candidate file into datasets/<local_dir>/<source>/tags.<fmt> with an
-    import-disabled manifest. Returns {id, name, source, format, sources}.
+    Enumerates the repo's top-level directories and downloads each one's first matching
+    candidate file into datasets/<local_dir>/<source>/tags.<fmt> with an import-disabled
+    manifest, preset["concurrency"] (default _DOWNLOAD_WORKERS) at a time. By default the
+    first failure cancels the rest and is raised; with preset["on_error"] == "continue" failed
+    sources are skipped and listed. Sources still current upstream are left alone, and the
+    cache is only rebuilt if some source changed. Returns {id, name, source, format,
+    sources, failed, updated}.
+
+    Progress is aggregated over the parallel downloads: downloaded/total sum the started
+    files, label names the sources in flight.
     """
     def upd(**kw):
         if progress is not None:
@@ -790,65 +2784,78 @@ def _download_multi_source(preset, progress=None):
         raise ValueError("Invalid preset local_dir")
     os.makedirs(dest_root, exist_ok=True)
 
-    upd(phase="downloading", downloaded=0, total=0, files_done=0, files_total=0, label="")
+    upd(phase="downloading", downloaded=0, total=0, files_done=0, files_total=0, label="",
+        failed=[])
     dirs = _hf_list_dirs(repo)
     upd(files_total=len(dirs))
 
-    downloaded_sources = []
-    for i, sub in enumerate(dirs):
-        source_name = sub.split("/")[-1]
-        upd(label=source_name, files_done=i, downloaded=0, total=0)
+    fail_fast = preset.get("on_error", "fail") != "continue"
+    cancelled = threading.Event()
+    lock = threading.Lock()
+    sizes = {}  # source dir -> (downloaded, total) of its file in flight or done
+    active = []
+    finished = []
 
-        dest_dir = os.path.abspath(os.path.join(dest_root, source_name))
-        if os.path.commonpath([dest_root, dest_dir]) != dest_root:
-            continue  # guard against traversal via an unexpected directory name
+    def report():
+        upd(downloaded=sum(d for d, _ in sizes.values()),
+            total=sum(t for _, t in sizes.values()),
+            files_done=len(finished), label=", ".join(active))
 
-        chosen = None
-        for candidate in preset.get("files", []):
-            remote, fmt = candidate["remote"], candidate["format"]
-            file_url = f"https://huggingface.co/datasets/{repo}/resolve/main/{sub}/{remote}"
-            os.makedirs(dest_dir, exist_ok=True)
-            dest = os.path.join(dest_dir, f"tags.{fmt}")
+    def fetch(sub):
+        if cancelled.is_set():
+            return None
+
+        def on_bytes(downloaded, total):
+            if cancelled.is_set():
+                raise _DownloadCancelled()
+            with lock:
+                sizes[sub] = (downloaded, total)
+                report()
+
+        with lock:
+            active.append(sub.split("/")[-1])
+            report()
+        try:
+            return _download_source(preset, sub, dest_root, progress_cb=on_bytes)
+        finally:
+            with lock:
+                active.remove(sub.split("/")[-1])
+                finished.append(sub)
+                report()
+
+    downloaded_sources, failed, first_error, updated = [], [], None, False
+    workers = max(1, int(preset.get("concurrency") or _DOWNLOAD_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spl-download") as pool:
+        futures = {pool.submit(fetch, sub): sub for sub in dirs}
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION if fail_fast else ALL_COMPLETED)
+        if fail_fast and any(f.exception() for f in done):
+            cancelled.set()  # running downloads stop at their next chunk; queued ones skip
+        for future, sub in futures.items():
             try:
-                _download_file(
-                    file_url, dest,
-                    progress_cb=lambda d, tot: upd(downloaded=d, total=tot),
-                )
-                chosen = (dest, fmt, remote)
-                break
-            except requests.HTTPError as e:
-                status = e.response.status_code if e.response is not None else None
-                if status in (401, 403, 404):
-                    continue  # this source lacks that format; try the next candidate
-                raise
+                outcome = future.result()
+            except _DownloadCancelled:
+                continue
+            except Exception as e:
+                failed.append({"source": sub.split("/")[-1], "error": str(e)})
+                first_error = first_error or e
+                continue
+            if outcome:
+                downloaded_sources.append(outcome[0])
+                updated = updated or outcome[1]
 
-        if not chosen:
-            continue  # no candidate file present for this source; skip it
-
-        dest, fmt, remote = chosen
-        # Replace semantics: drop any other tag format left in this source dir.
-        for stale in _STALE_TAG_FILES:
-            stale_path = os.path.join(dest_dir, stale)
-            if stale_path != dest and os.path.exists(stale_path):
-                os.remove(stale_path)
-
-        _write_manifest(dest_dir, {
-            "preset_id": preset["id"],
-            "format": fmt,
-            "remote": remote,
-            "mapping": preset.get("mapping"),
-            "downloaded_at": time.time(),
-        })
-        downloaded_sources.append(source_name)
-
-    upd(files_done=len(dirs), label="")
+    downloaded_sources.sort()
+    upd(files_done=len(dirs), label="", failed=failed)
+    if first_error is not None and (fail_fast or not downloaded_sources):
+        raise first_error
 
     if not downloaded_sources:
         raise ValueError(f"No tag files were found in '{repo}'")
 
     # Per-site adapters normalize these on import; rebuild so they're immediately searchable.
-    upd(phase="importing", imported=0)
-    ensure_cache(progress_cb=lambda n: upd(imported=n))
+    if updated and refresh_cache:
+        upd(phase="importing", imported=0)
+        invalidate_sources()
+        ensure_cache(progress_cb=lambda n: upd(imported=n))
 
     return {
         "id": preset["id"],
@@ -856,6 +2863,8 @@ def _download_multi_source(preset, progress=None):
         "source": "",  # merged across many sites; nothing single to focus in the browser
         "format": "multi",
         "sources": downloaded_sources,
+        "failed": failed,
+        "updated": updated,
     }
 
 
@@ -873,6 +2882,40 @@ def _count_downloaded_sources(root):
     return count
 
 
+def refresh_presets(progress=None):
+    """Bring every downloaded preset up to date with upstream, rebuilding the cache once.
+
+    Unchanged files cost one conditional HEAD request each (see _current_download). Returns
+    one download_preset result per downloaded preset, or {id, name, error} if it failed.
+    """
+    def upd(**kw):
+        if progress is not None:
+            progress.update(kw)
+
+    datasets_dir = get_datasets_dir()
+    results = []
+    for preset in presets_registry.list_presets():
+        root = os.path.join(datasets_dir, preset["local_dir"])
+        if preset.get("kind") == "multi_source":
+            downloaded = _count_downloaded_sources(root) > 0
+        else:
+            downloaded = bool(_read_manifest(root)[0])
+        if not downloaded:
+            continue
+        upd(label=preset.get("name", preset["id"]), files_done=0, files_total=0)
+        try:
+            results.append(download_preset(preset, progress=progress, refresh_cache=False))
+        except (ValueError, requests.RequestException) as e:
+            results.append({"id": preset["id"], "name": preset.get("name", preset["id"]),
+                            "error": str(e)})
+
+    if any(r.get("updated") for r in results):
+        upd(phase="importing", imported=0, label="")
+        invalidate_sources()
+        ensure_cache(progress_cb=lambda n: upd(imported=n))
+    return results
+
+
 def presets_status():
     """Return each registered preset with whether it is downloaded and its cached tag count."""
     ensure_cache()
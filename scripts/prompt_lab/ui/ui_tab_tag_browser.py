@@ -52,6 +52,16 @@ def ui_tab_tag_browser():
                             <option value="post_count">Popularity</option>
                             <option value="name">Name (A–Z)</option>
                             <option value="post_count_asc">Least used</option>
+                            <option value="source_count">Most sources</option>
+                        </select>
+                    </label>
+                    <label class="spl-tags-field">
+                        <span class="spl-tags-field-label">In sources</span>
+                        <select id="sd-prompt-lab-tags-min-sources" class="spl-tags-select">
+                            <option value="">Any</option>
+                            <option value="2">2+</option>
+                            <option value="3">3+</option>
+                            <option value="4">4+</option>
                         </select>
                     </label>
                     <label class="spl-tags-toggle">
@@ -100,6 +110,14 @@ def ui_tab_tag_browser():
                         Downloaded datasets are stored under <code>datasets/</code> and can be
                         re-downloaded to refresh them.
                     </div>
+                    <div class="spl-tags-presets-toolbar">
+                        <button type="button" id="sd-prompt-lab-tags-presets-refresh" class="spl-tags-btn"
+                                title="Re-download only the datasets that changed upstream">
+                            <span class="material-symbols-rounded" aria-hidden="true">sync</span>
+                            Check all for updates
+                        </button>
+                        <span id="sd-prompt-lab-tags-presets-refresh-status" class="spl-tags-dialog-msg"></span>
+                    </div>
                     <div id="sd-prompt-lab-tags-presets-list" class="spl-tags-presets-list"></div>
                 </div>
             </div>
@@ -0,0 +1,35 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import scripts.prompt_lab.sd_promt_lab_env as env  # noqa: E402
+import scripts.prompt_lab.sd_prompt_lab_tags_db as tags_db  # noqa: E402
+
+
+@pytest.fixture
+def datasets(tmp_path, monkeypatch):
+    """An empty datasets/ directory under a fresh extension data dir; returns its path."""
+    monkeypatch.setattr(env, "script_dir", str(tmp_path))
+    monkeypatch.setattr(tags_db, "_SOURCES_CHECK_TTL", 0)
+    tags_db.invalidate_sources()
+    tags_db.clear_result_cache()
+    path = tmp_path / "datasets"
+    path.mkdir()
+    return path
+
+
+def write_jsonl(path, records):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def tag_records(prefix, count):
+    return [{"name": f"{prefix}_{i}", "post_count": i, "category": i % 5} for i in range(count)]
@@ -0,0 +1,23 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("PIL")
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from scripts.prompt_lab.sd_prompt_lab_api import init_api  # noqa: E402
+
+
+@pytest.fixture
+def client(datasets):
+    app = FastAPI()
+    init_api(app)
+    return TestClient(app)
+
+
+def test_resolve_reports_missing_datasets(client):
+    res = client.post("/sd-prompt-lab/tags/resolve", json={"names": ["long_hair", "1girl"]})
+    assert res.status_code == 200
+    assert res.json() == {"available": False, "tags": []}
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("PIL")  # sd_prompt_lab_utils, imported by the db module, needs Pillow
+
+import scripts.prompt_lab.sd_promt_lab_env as env  # noqa: E402
+import scripts.prompt_lab.sd_prompt_lab_db as db  # noqa: E402
+
+
+@pytest.fixture
+def prompts_db(tmp_path, monkeypatch):
+    """A fresh prompt library database under a temporary extension data dir."""
+    monkeypatch.setattr(env, "script_dir", str(tmp_path))
+    db.init_db()
+    return db
+
+
+def test_word_completion_is_prefix_only_unless_asked(prompts_db):
+    prompts_db.insert_prompt_words_list(["red_hair", "Red_eyes", "bored", "red_hair", "rest"])
+
+    assert [r["word"] for r in prompts_db.rank_prompt_words("red")] == ["red_hair", "Red_eyes"]
+    assert [(r["word"], r["prefix"]) for r in prompts_db.rank_prompt_words("red", infix=True)] == [
+        ("red_hair", True), ("Red_eyes", True), ("bored", False),
+    ]
+    assert prompts_db.rank_prompt_words("re", limit=1) == [{"word": "red_hair", "uses": 2, "prefix": True}]
+    # v1 autocomplete: every substring match, in the unique index's (binary) order as before
+    assert prompts_db.search_prompt_words("re") == ["Red_eyes", "bored", "red_hair", "rest"]
+
+
+def test_removing_a_tag_drops_its_pairs_both_ways(prompts_db):
+    first = prompts_db.save_or_update_prompt({"name": "first", "prompt": "a, b, c"})
+    prompts_db.save_or_update_prompt({"name": "second", "prompt": "a, b"})
+    prompts_db.save_or_update_prompt({"name": "first", "prompt": "a, b", "override": True})
+
+    with prompts_db.connect() as conn:
+        assert conn.execute("SELECT * FROM tag_pairs WHERE n <= 0 OR 'c' IN (a, b)").fetchall() == []
+        assert conn.execute("SELECT a, b, n FROM tag_pairs ORDER BY a").fetchall() == [("a", "b", 2), ("b", "a", 2)]
+    assert prompts_db.get_related_tags(["c"]) == []
+    assert prompts_db.get_related_tags(["b"]) == [{"tag": "a", "score": 2}]
+
+    prompts_db.delete_prompt_by_id(first)
+    assert prompts_db.get_related_tags(["a"]) == [{"tag": "b", "score": 1}]
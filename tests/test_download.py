@@ -0,0 +1,238 @@
+import gzip
+import hashlib
+import http.server
+import json
+import re
+import threading
+
+import pytest
+import requests
+from conftest import tag_records
+
+import scripts.prompt_lab.sd_prompt_lab_tags_db as tags_db
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Serves `server.files` roughly like the Hugging Face CDN (see _Server)."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def _respond(self, body):
+        srv = self.server
+        srv.log.append((self.command, self.path, dict(self.headers)))
+        name = self.path.rsplit("/", 1)[-1]
+        if name not in srv.files:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data, etag = srv.files[name], srv.etag(name)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        status, start, headers = 200, 0, {"ETag": etag, "Accept-Ranges": "bytes"}
+        if srv.linked_sha256 is not None:
+            headers["X-Linked-Etag"] = f'"{srv.linked_sha256 or hashlib.sha256(data).hexdigest()}"'
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range", etag) == etag:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            data = data[start:end + 1]
+        elif srv.gzip and "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data)
+            headers["Content-Encoding"] = "gzip"
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if not body:
+            return
+        with srv.lock:
+            drop, srv.drop_after = srv.drop_after, None
+        if drop is not None:
+            self.wfile.write(data[:drop])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    """`files` maps a file name to its bytes (its ETag follows the content). drop_after cuts
+    the next GET after that many body bytes; gzip encodes a whole response for a client that
+    accepts it; linked_sha256 is "" for the correct X-Linked-Etag, a digest to lie, None for
+    none."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.files = {}
+        self.log = []
+        self.lock = threading.Lock()
+        self.drop_after = None
+        self.gzip = False
+        self.linked_sha256 = ""
+
+    def etag(self, name):
+        return '"%s"' % hashlib.md5(self.files[name]).hexdigest()
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.server_port}/datasets/test/repo/resolve/main/{name}"
+
+    def gets(self):
+        return [headers for method, _, headers in self.log if method == "GET"]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(tags_db, "_DOWNLOAD_BACKOFF", 0)
+    monkeypatch.setattr(tags_db, "_DOWNLOAD_CHUNK", 16 << 10)
+    srv = _Server()
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _payload(size, seed=b"tags"):
+    out = bytearray()
+    block = seed
+    while len(out) < size:
+        block = hashlib.sha256(block).digest()
+        out += block
+    return bytes(out[:size])
+
+
+def test_dropped_connection_resumes_with_a_range(server, tmp_path):
+    server.files["tags.jsonl"] = data = _payload(300_000)
+    server.drop_after = 100_000
+    dest = str(tmp_path / "tags.jsonl")
+
+    upstream = tags_db._download_file(server.url("tags.jsonl"), dest)
+
+    assert open(dest, "rb").read() == data
+    first, resumed = server.gets()
+    assert "Range" not in first
+    assert 0 < int(re.fullmatch(r"bytes=(\d+)-", resumed["Range"]).group(1)) <= 100_000
+    assert resumed["If-Range"] == server.etag("tags.jsonl")
+    assert upstream["sha256"] == hashlib.sha256(data).hexdigest()
+    assert not (tmp_path / "tags.jsonl.part.state").exists()
+
+
+def test_changed_file_restarts_instead_of_resuming(server, tmp_path):
+    server.files["tags.jsonl"] = _payload(300_000)
+    server.drop_after = 100_000
+    dest = str(tmp_path / "tags.jsonl")
+    with pytest.raises(requests.RequestException):
+        tags_db._fetch_part(server.url("tags.jsonl"), dest)
+    assert 0 < (tmp_path / "tags.jsonl.part").stat().st_size < 300_000
+
+    server.files["tags.jsonl"] = data = _payload(200_000, seed=b"new")
+    tags_db._download_file(server.url("tags.jsonl"), dest)
+
+    assert open(dest, "rb").read() == data  # If-Range failed: the whole new file, not a splice
+    assert server.gets()[-1]["Range"]
+
+
+def test_linked_sha256_mismatch_discards_the_download(server, tmp_path):
+    server.files["tags.jsonl"] = _payload(50_000)
+    server.linked_sha256 = "0" * 64
+    dest = str(tmp_path / "tags.jsonl")
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        tags_db._download_file(server.url("tags.jsonl"), dest)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_gzip_capable_server_gets_an_identity_request(server, tmp_path):
+    server.files["tags.jsonl"] = data = b'{"name": "tag", "post_count": 1}\n' * 20_000
+    server.gzip = True
+    dest = str(tmp_path / "tags.jsonl")
+
+    tags_db._download_file(server.url("tags.jsonl"), dest)
+
+    assert open(dest, "rb").read() == data
+    assert [headers["Accept-Encoding"] for headers in server.gets()] == ["identity"]
+
+
+def test_segmented_download_resumes_a_dropped_segment(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(tags_db, "_SEGMENT_MIN_SIZE", 64 << 10)
+    server.files["tags.db"] = data = _payload(400_000)
+    server.gzip = True
+    server.drop_after = 30_000
+    dest = str(tmp_path / "tags.db")
+
+    tags_db._download_file(server.url("tags.db"), dest, segments=4)
+
+    assert open(dest, "rb").read() == data
+    head, *gets = server.log
+    assert head[0] == "HEAD" and head[2]["Accept-Encoding"] == "identity"
+    assert len(gets) == 5  # four segments, one of them twice
+    assert all(headers["Range"] and headers["Accept-Encoding"] == "identity" for _, _, headers in gets)
+
+
+def _preset(server, monkeypatch):
+    monkeypatch.setattr(tags_db, "_HF_DATASETS", f"http://127.0.0.1:{server.server_port}/datasets")
+    return {"id": "test", "repo": "test/repo", "local_dir": "test",
+            "files": [{"remote": "tags.jsonl", "format": "jsonl"}]}
+
+
+def _jsonl(records):
+    return "".join(json.dumps(r) + "\n" for r in records).encode("utf-8")
+
+
+def test_jsonl_preset_is_imported_while_it_downloads(datasets, server, monkeypatch):
+    preset = _preset(server, monkeypatch)
+    server.files["tags.jsonl"] = _jsonl(tag_records("stream", 20_000))
+    server.gzip = True
+    server.drop_after = 200_000
+
+    def no_second_import(*args, **kwargs):
+        raise AssertionError("the download was imported again after it finished")
+
+    monkeypatch.setattr(tags_db, "ensure_cache", no_second_import)
+    progress = {}
+    result = tags_db.download_preset(preset, progress=progress)
+
+    assert result["updated"] and result["source"] == "test/tags.jsonl"
+    assert (datasets / "test" / "tags.jsonl").read_bytes() == server.files["tags.jsonl"]
+    assert not (datasets / "test" / "tags.jsonl.part").exists()
+    assert progress["imported"] == 20_000
+    assert tags_db.count_tags() == 20_000
+    assert tags_db.complete_tags("stream_1999", limit=1)[0]["post_count"] == 19_999
+    assert len(server.gets()) == 2  # the dropped connection was resumed, not restarted
+
+
+def test_unchanged_preset_costs_one_conditional_head(datasets, server, monkeypatch):
+    preset = _preset(server, monkeypatch)
+    server.files["tags.jsonl"] = _jsonl(tag_records("old", 100))
+    assert tags_db.download_preset(preset)["updated"]
+    etag = server.etag("tags.jsonl")
+
+    server.log.clear()
+    assert not tags_db.download_preset(preset)["updated"]
+    [(method, _, headers)] = server.log
+    assert method == "HEAD"
+    assert headers["If-None-Match"] == etag and headers["Accept-Encoding"] == "identity"
+
+    server.files["tags.jsonl"] = _jsonl(tag_records("new", 50))
+    assert tags_db.download_preset(preset)["updated"]
+    assert tags_db.count_tags() == 50
@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+
+from conftest import ROOT, tag_records, write_jsonl
+
+import scripts.prompt_lab.sd_prompt_lab_tags_db as tags_db
+
+
+def test_import_pool_runs_without_extension_on_sys_path(datasets, monkeypatch):
+    for name in ("a", "b", "c"):
+        write_jsonl(datasets / name / "tags.jsonl", tag_records(name, 3000))
+    # What the WebUI leaves behind after loading extensions.
+    monkeypatch.setattr(sys, "path", [p for p in sys.path if os.path.abspath(p or ".") != ROOT])
+    monkeypatch.setattr(tags_db, "_IMPORT_WORKERS", 2)
+    monkeypatch.setattr(tags_db, "_PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(tags_db, "_PARALLEL_CHUNK", 16 << 10)
+
+    inline = []
+    source_rows = tags_db._source_rows
+    monkeypatch.setattr(
+        tags_db, "_source_rows", lambda source, items: inline.append(source) or source_rows(source, items)
+    )
+    tags_db.ensure_cache()
+
+    assert inline == []  # every unit was parsed by a worker, none fell back to this process
+    assert tags_db.count_tags() == 9000
+    assert tags_db.complete_tags("b_299", limit=1)[0]["name"] == "b_2999"
+
+
+def test_resolve_without_any_dataset(datasets):
+    assert not tags_db.has_tags()  # no generation at all
+    tags_db.ensure_cache()
+    assert not tags_db.has_tags()  # an empty one
+
+    write_jsonl(datasets / "a" / "tags.jsonl", tag_records("a", 3))
+    tags_db.ensure_cache()
+    assert tags_db.has_tags()
+    assert [t["found"] for t in tags_db.resolve_tags(["A_1", "b_1"])] == [True, False]
+
+
+def test_one_source_edit_leaves_other_data_alone(datasets, monkeypatch, tmp_path):
+    write_jsonl(datasets / "big" / "tags.jsonl", tag_records("big", 5000))
+    write_jsonl(datasets / "small" / "tags.jsonl", tag_records("small", 20))
+    tags_db.ensure_cache()
+
+    def snapshot():
+        with tags_db.connect() as conn:
+            return {
+                "tags": conn.execute("SELECT * FROM tags WHERE name LIKE 'big%' ORDER BY id").fetchall(),
+                "rows": conn.execute(
+                    "SELECT rowid, * FROM tag_sources WHERE source = 'big/tags.jsonl' ORDER BY rowid"
+                ).fetchall(),
+            }
+
+    before = snapshot()
+    write_index = tags_db.tag_index.write_index
+
+    def no_full_index(*args, **kwargs):
+        raise AssertionError("the prefix index was rewritten from all tags")
+
+    monkeypatch.setattr(tags_db.tag_index, "write_index", no_full_index)
+    records = tag_records("small", 20)[5:] + [{"name": "big_1", "post_count": 10 ** 6}]
+    write_jsonl(datasets / "small" / "tags.jsonl", records)
+    os.utime(datasets / "small" / "tags.jsonl", (1, 1))
+    tags_db.ensure_cache()
+
+    after = snapshot()
+    assert after["rows"] == before["rows"]  # the unchanged source's rows kept, not re-imported
+    assert [t for t in after["tags"] if t[1] != "big_1"] == [t for t in before["tags"] if t[1] != "big_1"]
+    assert tags_db.count_tags() == 5015
+
+    # The patched index and top-k rows are exactly what a full write gives.
+    path = tags_db.get_tags_db_path()
+    with tags_db.connect() as conn:
+        full = write_index(conn, str(tmp_path / "full.idx"), prefix_len=3, topk=20)
+        stored = {p: json.loads(t) for p, t in conn.execute("SELECT prefix, tags FROM tag_prefix_topk")}
+    assert (tmp_path / "full.idx").read_bytes() == open(tags_db._index_path(path), "rb").read()
+    assert stored == full
+    assert tags_db.complete_tags("bi", limit=1)[0]["name"] == "big_1"
+
+
+def test_complete_tags_breaks_ties_by_name(datasets, monkeypatch):
+    records = [{"name": name, "post_count": 7, "category": 0} for name in ("ab_c", "Ab_b", "ab_a")]
+    write_jsonl(datasets / "a" / "tags.jsonl", records + [{"name": "ab_z", "post_count": 9}])
+    tags_db.ensure_cache()
+    expected = ["ab_z", "Ab_b", "ab_a", "ab_c"]
+
+    assert [t["name"] for t in tags_db.complete_tags("ab")] == expected  # tag_prefix_topk
+    assert [t["name"] for t in tags_db.complete_tags("ab_")] == expected  # mapped index
+    monkeypatch.setattr(tags_db.tag_index, "load", lambda path: None)
+    assert [t["name"] for t in tags_db.complete_tags("ab_")] == expected  # plain SQL
+
+
+def test_published_generation_is_kept_in_memory(datasets, monkeypatch):
+    write_jsonl(datasets / "a" / "tags.jsonl", tag_records("a", 10))
+    tags_db.ensure_cache()
+    first = tags_db.get_tags_db_path()
+    write_jsonl(datasets / "b" / "tags.jsonl", tag_records("b", 10))
+    tags_db.invalidate_sources()
+    tags_db.ensure_cache()
+    second = tags_db.get_tags_db_path()
+    assert second != first
+
+    current_generation = tags_db._current_generation
+
+    def no_pointer_reads():
+        raise AssertionError("the pointer file was read again")
+
+    monkeypatch.setattr(tags_db, "_current_generation", no_pointer_reads)
+    assert tags_db.complete_tags("b_", limit=1)[0]["name"] == "b_9"
+    assert tags_db.get_tags_db_path() == second
+
+    # Another process repointing the cache is still noticed.
+    monkeypatch.setattr(tags_db, "_current_generation", current_generation)
+    pointer = os.path.join(tags_db.get_cache_dir(), tags_db._CACHE_POINTER_NAME)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(os.path.basename(first)[len(tags_db._CACHE_DB_PREFIX):-len(".db")])
+    os.replace(pointer + ".tmp", pointer)
+    assert tags_db.get_tags_db_path() == first
+    assert tags_db.count_tags() == 10